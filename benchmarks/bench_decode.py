@@ -0,0 +1,66 @@
+"""
+Per-game decode cost of ESPN summaries: full json.loads versus the
+selective decoder, each followed by parsing into the game model.
+
+Usage:
+    python -m benchmarks.bench_decode [recorded_summary.json ...] [--json]
+
+Recorded payloads may be plain or gzipped JSON files. Without any, a
+synthetic mid-game summary is used.
+"""
+
+import argparse
+import gzip
+import json
+import os
+from game_model import GameSummary
+from summary_decoder import decode_summary
+from benchmarks.synthetic import make_summary
+from benchmarks.timing import time_per_call
+
+
+def load_payload(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+def bench_payload(name, content):
+    full = time_per_call(lambda: json.loads(content))
+    selective = time_per_call(lambda: decode_summary(content))
+    full_parse = time_per_call(lambda: GameSummary.from_dict(json.loads(content)))
+    selective_parse = time_per_call(lambda: GameSummary.from_dict(decode_summary(content)))
+    return {'payload': name, 'bytes': len(content),
+            'full_decode_ms': full * 1000, 'selective_decode_ms': selective * 1000,
+            'full_parse_ms': full_parse * 1000, 'selective_parse_ms': selective_parse * 1000,
+            'speedup': full_parse / selective_parse}
+
+
+def run(paths=()):
+    if paths:
+        payloads = [(os.path.basename(path), load_payload(path)) for path in paths]
+    else:
+        payloads = [('synthetic', json.dumps(make_summary()).encode('utf-8'))]
+    return [bench_payload(name, content) for name, content in payloads]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ESPN summary decoding.")
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--json', action='store_true', dest='json')
+    args = parser.parse_args()
+
+    results = run(args.paths)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"{result['payload']}: {result['bytes'] / 1024:.0f} KB\n"
+              f"  decode:           full {result['full_decode_ms']:.2f} ms, "
+              f"selective {result['selective_decode_ms']:.2f} ms\n"
+              f"  decode and parse: full {result['full_parse_ms']:.2f} ms, "
+              f"selective {result['selective_parse_ms']:.2f} ms ({result['speedup']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
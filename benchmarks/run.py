@@ -0,0 +1,389 @@
+"""
+Benchmark suite for the bot's hot paths.
+
+Usage:
+    python -m benchmarks.run [--output results.json] [--baseline baseline.json]
+                             [--only NAME ...] [--payload summary.json ...] [--quick]
+
+Every benchmark runs on fixed, seeded synthetic inputs (plus any recorded
+summary payloads given with --payload) inside a scratch directory, so it
+never touches the bot's real state. Results are written as JSON; with
+--baseline, each metric is compared to an earlier run and the command exits
+non-zero if any got slower than --threshold allows.
+"""
+
+import argparse
+import contextlib
+from datetime import datetime, timezone
+import functools
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+from benchmarks import bench_decode
+from benchmarks.synthetic import make_summary
+from benchmarks.timing import time_per_call
+
+# About 26 seasons of punts, and a full current season
+HISTORICAL_SIZE = 60000
+CURRENT_SIZE = 2300
+
+
+def make_indices(size, seed):
+    return np.random.default_rng(seed).lognormal(mean=0.5, sigma=1.5, size=size)
+
+
+def median_time(function, arguments):
+    # Calls that write to disk are dominated by fsync, so the median is steadier than the mean
+    times = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def make_games(n_games, n_drives, base_url=None):
+    from game_model import GameSummary
+    from nfl_game import NFLGame
+
+    games = []
+    for number in range(n_games):
+        game_id = str(401700000 + number)
+        game = NFLGame({'id': game_id, 'date': '2024-10-06T17:00Z'})
+        game.summary = GameSummary.from_dict(make_summary(game_id, drives=n_drives, filler_kb=0, seed=number))
+        game.summary_changed = True
+        games.append(game)
+    return games
+
+
+class BenchmarkContext:
+    """A scratch directory holding synthetic historical indices and a bot."""
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='surrender_index_bench_')
+        self.previous_directory = os.getcwd()
+        self.bot = None
+        self.state_count = 0
+
+    def __enter__(self):
+        os.chdir(self.directory)
+        np.save('1999-2024_surrender_indices.npy', make_indices(HISTORICAL_SIZE, seed=1))
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.bot is not None:
+            self.bot.state_store.close()
+        os.chdir(self.previous_directory)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def get_bot(self):
+        if self.bot is None:
+            import surrender_index_bot
+            from mastodon_utils import FakeMastodonBot
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.bot = surrender_index_bot.SurrenderIndexBot()
+            self.bot.mastodon_accounts['nfl'] = (FakeMastodonBot('main'), FakeMastodonBot('ninety'))
+            self.bot.state_store.add_current_indices(make_indices(CURRENT_SIZE, seed=2))
+            self.bot.percentile_engines['nfl'] = self.bot.load_percentile_engine()
+        return self.bot
+
+    def reset_bot_state(self):
+        """Give the bot an empty state store, as on the first run of the season."""
+        from job_queue import JobQueue
+        from state_store import StateStore
+
+        bot = self.get_bot()
+        bot.state_store.close()
+        self.state_count += 1
+        bot.state_store = StateStore(f'state_{self.state_count}.db')
+        bot.job_queue = JobQueue(bot.state_store)
+        bot.load_state()
+        return bot
+
+
+def bench_surrender_index(context, quick):
+    from surrender_index import SurrenderIndex
+
+    games = make_games(1, 40)
+    game = games[0]
+    plays = [(drive.plays[-1], drive.plays[-2], drive) for drive in game.previous_drives]
+
+    def score_all():
+        for play, prev_play, drive in plays:
+            SurrenderIndex.calc_surrender_index(play, prev_play, drive, game)
+
+    return {'per_play_us': time_per_call(score_all, repeat=3 if quick else 5) / len(plays) * 1e6}
+
+
+def bench_percentiles(context, quick):
+    bot = context.get_bot()
+    values = make_indices(1000, seed=3)
+    engine = bot.percentile_engines['nfl']
+
+    def lookup_all():
+        for value in values:
+            bot.calculate_percentiles(value, should_update_file=False)
+
+    result = {'historical_size': len(engine.historical),
+              'current_size': len(engine.current),
+              'lookup_us': time_per_call(lookup_all, repeat=3 if quick else 5) / len(values) * 1e6}
+
+    # Recording an index also persists it and inserts it into the current season
+    result['update_us'] = median_time(bot.calculate_percentiles, values[:50 if quick else 200]) * 1e6
+
+    from situational_index import SITUATION_COUNT, SituationalIndex
+    keys = np.random.default_rng(4).integers(0, SITUATION_COUNT, HISTORICAL_SIZE)
+    situational_index = SituationalIndex.build('bench.sitx', make_indices(HISTORICAL_SIZE, seed=1), keys)
+    lookup_keys = keys[:len(values)].tolist()
+
+    def situational_lookup_all():
+        for value, key in zip(values, lookup_keys):
+            situational_index.percentile(value, key)
+
+    result['situational_lookup_us'] = time_per_call(situational_lookup_all, repeat=3 if quick else 5) / len(values) * 1e6
+    return result
+
+
+def bench_sketch(context, quick):
+    from percentile_engine import PercentileEngine, SketchPercentileEngine
+    from quantile_sketch import TDigest
+
+    historical = make_indices(HISTORICAL_SIZE, seed=1)
+    current = make_indices(CURRENT_SIZE, seed=2)
+    exact = PercentileEngine(historical, current)
+    # Quantiles of both distributions, plus values between them
+    values = np.concatenate([np.quantile(historical, np.linspace(0, 1, 500)), make_indices(500, seed=3)])
+    exact_current = np.array([exact.current_percentile(value) for value in values])
+    exact_combined = np.array([exact.combined_percentile(value) for value in values])
+    top_decile = exact_current >= 90
+
+    result = {}
+    for compression in ((200,) if quick else (100, 200, 400)):
+        sketch = SketchPercentileEngine(TDigest.from_values(historical, compression), current, compression)
+        current_error = np.abs(np.array([sketch.current_percentile(value) for value in values]) - exact_current)
+        combined_error = np.abs(np.array([sketch.combined_percentile(value) for value in values]) - exact_combined)
+        result.update({f'c{compression}.max_current_error': float(current_error.max()),
+                       f'c{compression}.max_combined_error': float(combined_error.max()),
+                       f'c{compression}.max_top_decile_error': float(current_error[top_decile].max()),
+                       f'c{compression}.bytes': len(sketch.historical.to_bytes())})
+
+    def lookup_all():
+        for value in values:
+            sketch.current_percentile(value)
+            sketch.combined_percentile(value)
+
+    result['lookup_us'] = time_per_call(lookup_all, repeat=3 if quick else 5) / len(values) * 1e6
+    seasons = np.array_split(historical, 26)
+    sketches = [TDigest.from_values(season, 200) for season in seasons]
+    result['merge_seasons_ms'] = time_per_call(
+        lambda: functools.reduce(lambda merged, season: merged.merge(season), sketches, TDigest(200)),
+        repeat=3) * 1000
+    return result
+
+
+def bench_live_callback(context, quick):
+    n_games, n_drives = (4, 10) if quick else (16, 24)
+    passes = {'seen_pass_ms': [], 'post_pass_ms': [], 'steady_pass_ms': []}
+
+    for _ in range(2 if quick else 3):
+        bot = context.reset_bot_state()
+        games = make_games(n_games, n_drives)
+        with contextlib.redirect_stdout(io.StringIO()):
+            # The first pass sees every punt and posts those that are stable, the
+            # second confirms and posts the rest, and the third has nothing new to do
+            for name in passes:
+                start = time.perf_counter()
+                bot.live_callback(games)
+                passes[name].append((time.perf_counter() - start) * 1000)
+                for game in games:
+                    game.summary_changed = True
+
+    result = {name: min(times) for name, times in passes.items()}
+    result.update({'games': n_games, 'drives': n_drives})
+    return result
+
+
+def bench_posting(context, quick):
+    from mastodon_utils import FakeMastodonBot
+    from posting_pipeline import PostingPipeline
+
+    n_games, n_drives = (4, 6) if quick else (8, 12)
+    # Seconds per call of a slow instance
+    latency = 0.02
+    bot = context.get_bot()
+    accounts, pipeline = bot.mastodon_accounts['nfl'], bot.posting_pipeline
+    result = {}
+    for name, started in (('inline', False), ('pipeline', True)):
+        bot = context.reset_bot_state()
+        bot.mastodon_accounts['nfl'] = (FakeMastodonBot('main', latency=latency),
+                                        FakeMastodonBot('ninety', latency=latency))
+        bot.posting_pipeline = PostingPipeline()
+        if started:
+            bot.posting_pipeline.start()
+        games = make_games(n_games, n_drives)
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Every punt is posted within two passes; how long they hold up detection
+            start = time.perf_counter()
+            for _ in range(2):
+                bot.live_callback(games)
+                for game in games:
+                    game.summary_changed = True
+            result[f'{name}.callback_ms'] = (time.perf_counter() - start) * 1000
+            bot.posting_pipeline.stop()
+            result[f'{name}.posted_ms'] = (time.perf_counter() - start) * 1000
+        result[f'{name}.posted'] = len(bot.get_main_account().events)
+    bot.mastodon_accounts['nfl'], bot.posting_pipeline = accounts, pipeline
+    return result
+
+
+def bench_summary_decode(context, quick, payloads=()):
+    results = {}
+    for result in bench_decode.run(payloads):
+        name = result.pop('payload')
+        results.update({f'{name}.{metric}': value for metric, value in result.items()})
+    return results
+
+
+def bench_tweeted_plays(context, quick):
+    bot = context.reset_bot_state()
+    drives = make_games(1, 40)[0].previous_drives
+    count = 40 if quick else 200
+
+    mark_us = median_time(lambda number: bot.update_tweeted_plays(drives[number % len(drives)], str(number)),
+                          range(count)) * 1e6
+
+    load = time_per_call(bot.state_store.load_posted, repeat=3)
+    return {'mark_posted_us': mark_us, 'load_posted_ms': load * 1000, 'posted': count}
+
+
+def time_subprocess(code, cwd, repeat):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_startup(context, quick):
+    # Build the historical store once, so startup measures a warm start
+    context.get_bot()
+    repeat = 2 if quick else 5
+    return {'interpreter_ms': time_subprocess('pass', context.directory, repeat) * 1000,
+            'import_ms': time_subprocess('import surrender_index_bot', context.directory, repeat) * 1000,
+            'construct_ms': time_subprocess('import surrender_index_bot as s; s.SurrenderIndexBot()',
+                                            context.directory, repeat) * 1000}
+
+
+BENCHMARKS = {
+    'surrender_index': bench_surrender_index,
+    'percentiles': bench_percentiles,
+    'sketch': bench_sketch,
+    'live_callback': bench_live_callback,
+    'posting': bench_posting,
+    'decode': bench_summary_decode,
+    'tweeted_plays': bench_tweeted_plays,
+    'startup': bench_startup,
+}
+
+# Metrics that describe the input rather than a cost
+SIZE_METRICS = {'historical_size', 'current_size', 'games', 'drives', 'posted', 'bytes'}
+
+
+def run(names=None, quick=False, payloads=()):
+    results = {}
+    with BenchmarkContext() as context:
+        for name in names or BENCHMARKS:
+            print(f"Running {name}...", file=sys.stderr)
+            if name == 'decode':
+                results[name] = bench_summary_decode(context, quick, payloads)
+            else:
+                results[name] = BENCHMARKS[name](context, quick)
+    return results
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results to a baseline run.
+
+    Returns:
+        list: (benchmark, metric, baseline value, current value, ratio) for every
+            metric in both, and a list of the ones that regressed.
+    """
+    rows, regressions = [], []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if base is None or metric.rsplit('.', 1)[-1] in SIZE_METRICS or metric.endswith('speedup'):
+                continue
+            ratio = value / base if base else float('inf')
+            rows.append((name, metric, base, value, ratio))
+            if ratio > threshold:
+                regressions.append((name, metric, base, value, ratio))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Surrender Index benchmark suite.")
+    parser.add_argument('--output', dest='output')
+    parser.add_argument('--baseline', dest='baseline')
+    parser.add_argument('--threshold', type=float, default=1.2, dest='threshold',
+                        help="Slowdown ratio against the baseline that counts as a regression")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), dest='only')
+    parser.add_argument('--payload', nargs='+', default=[], dest='payload')
+    parser.add_argument('--quick', action='store_true', dest='quick')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                 'revision': get_git_revision(),
+                 'python': platform.python_version(),
+                 'platform': platform.platform(),
+                 'quick': args.quick},
+        'results': run(args.only, args.quick, [os.path.abspath(path) for path in args.payload]),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report['results'], baseline['results'], args.threshold)
+        print(f"\nCompared to {args.baseline} ({baseline['meta'].get('revision')}):", file=sys.stderr)
+        for name, metric, base, value, ratio in rows:
+            flag = '  REGRESSION' if ratio > args.threshold else ''
+            print(f"  {name}.{metric}: {base:.4g} -> {value:.4g} ({ratio:.2f}x){flag}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Deterministic, ESPN-shaped synthetic payloads for benchmarks and replays.
+
+The summaries follow the layout of the ESPN summary API (header, boxscore,
+drives, plus the leaders, news, videos and odds sections the bot never
+reads) and are sized like real mid-game payloads.
+"""
+
+import random
+
+TEAMS = [('22', 'ARI'), ('1', 'ATL'), ('33', 'BAL'), ('2', 'BUF'), ('29', 'CAR'), ('3', 'CHI'),
+         ('4', 'CIN'), ('5', 'CLE'), ('6', 'DAL'), ('7', 'DEN'), ('8', 'DET'), ('9', 'GB'),
+         ('34', 'HOU'), ('11', 'IND'), ('30', 'JAX'), ('12', 'KC'), ('13', 'LV'), ('24', 'LAC'),
+         ('14', 'LAR'), ('15', 'MIA'), ('16', 'MIN'), ('17', 'NE'), ('18', 'NO'), ('19', 'NYG'),
+         ('20', 'NYJ'), ('21', 'PHI'), ('23', 'PIT'), ('25', 'SF'), ('26', 'SEA'), ('27', 'TB'),
+         ('10', 'TEN'), ('28', 'WSH')]
+
+
+def make_play_state(team, down, distance, yards_to_endzone, opponent):
+    if yards_to_endzone > 50:
+        possession_text = f'{team[1]} {100 - yards_to_endzone}'
+    elif yards_to_endzone == 50:
+        possession_text = f'{team[1]} 50'
+    else:
+        possession_text = f'{opponent[1]} {yards_to_endzone}'
+    return {'down': down, 'distance': distance, 'yardLine': 100 - yards_to_endzone,
+            'yardsToEndzone': yards_to_endzone, 'team': {'id': team[0]},
+            'possessionText': possession_text,
+            'downDistanceText': f'{down} & {distance} at {possession_text}',
+            'shortDownDistanceText': f'{down} & {distance}'}
+
+
+def make_drive(rng, drive_number, team, opponent, period, clock_seconds, scores, plays_per_drive, finished):
+    plays = []
+    yards_to_endzone = rng.randint(55, 80)
+    for play_number in range(plays_per_drive):
+        down = min(play_number + 1, 4)
+        distance = rng.randint(1, 12)
+        is_punt = finished and play_number == plays_per_drive - 1
+        clock_seconds = max(clock_seconds - rng.randint(5, 40), 0)
+        state = make_play_state(team, down, distance, yards_to_endzone, opponent)
+        plays.append({
+            'id': f'{drive_number}{play_number:03d}',
+            'sequenceNumber': str(drive_number * 100 + play_number),
+            'type': {'id': '52' if is_punt else '24', 'text': 'Punt' if is_punt else 'Pass Reception',
+                     'abbreviation': 'PUNT' if is_punt else 'REC'},
+            'text': f'Synthetic play {play_number} of drive {drive_number}. ' * 3,
+            'awayScore': scores[0], 'homeScore': scores[1],
+            'period': {'number': period},
+            'clock': {'displayValue': f'{clock_seconds // 60}:{clock_seconds % 60:02d}'},
+            'scoringPlay': False, 'priority': False, 'modified': '2024-10-06T18:00Z',
+            'wallclock': '2024-10-06T18:00:00Z',
+            'start': state,
+            'end': make_play_state(team, min(down + 1, 4), distance, max(yards_to_endzone - rng.randint(0, 8), 1),
+                                   opponent),
+            'statYardage': rng.randint(-3, 15),
+        })
+        yards_to_endzone = max(yards_to_endzone - rng.randint(0, 8), 1)
+    drive = {'id': str(drive_number), 'description': f'{plays_per_drive} plays, 20 yards, 2:31',
+             'team': {'id': team[0], 'abbreviation': team[1], 'displayName': team[1],
+                      'logos': [{'href': f'https://a.espncdn.com/i/teamlogos/nfl/500/{team[1]}.png'}]},
+             'start': {'period': {'number': period}, 'clock': {'displayValue': '15:00'}, 'text': state['possessionText']},
+             'end': {'period': {'number': period}, 'clock': {'displayValue': '0:00'}},
+             'timeElapsed': {'displayValue': '2:31'}, 'yards': 20, 'isScore': False, 'offensivePlays': plays_per_drive,
+             'plays': plays}
+    if finished:
+        drive['result'] = 'PUNT'
+        drive['displayResult'] = 'Punt'
+    return drive, clock_seconds
+
+
+def make_summary(game_id='401671001', drives=20, plays_per_drive=6, status='STATUS_IN_PROGRESS',
+                 season_type=2, filler_kb=300, seed=0):
+    """
+    Build a synthetic ESPN game summary.
+
+    Parameters:
+        game_id: The event ID.
+        drives: Number of drives played so far.
+        plays_per_drive: Plays in each drive.
+        status: The status type name, e.g. STATUS_IN_PROGRESS or STATUS_FINAL.
+        season_type: 2 for the regular season, 3 for the postseason.
+        filler_kb: Approximate size of the sections the bot never reads.
+        seed: Random seed.
+
+    Returns:
+        dict: The summary.
+    """
+    rng = random.Random(seed)
+    away, home = rng.sample(TEAMS, 2)
+    previous = []
+    clock_seconds, period = 900, 1
+    for drive_number in range(drives):
+        team, opponent = (away, home) if drive_number % 2 == 0 else (home, away)
+        drive, clock_seconds = make_drive(rng, int(game_id) * 100 + drive_number, team, opponent, period,
+                                          clock_seconds, (rng.randint(0, 21), rng.randint(0, 21)),
+                                          plays_per_drive, True)
+        previous.append(drive)
+        if clock_seconds == 0:
+            period, clock_seconds = min(period + 1, 4), 900
+    current, _ = make_drive(rng, int(game_id) * 100 + drives, away, home, period, clock_seconds, (0, 0), 2, False)
+
+    filler_item = {'headline': 'Synthetic news headline ' * 4, 'description': 'Synthetic description. ' * 20,
+                   'links': {'web': {'href': 'https://www.espn.com/nfl/story/_/id/00000000/synthetic'}}}
+    filler_count = max(filler_kb * 1024 // 600, 1)
+    players = [{'team': {'id': team[0], 'abbreviation': team[1]},
+                'statistics': [{'name': 'passing', 'athletes': [
+                    {'athlete': {'id': str(n), 'displayName': f'Player {n}'}, 'stats': [str(n)] * 8}
+                    for n in range(filler_count // 8)]}]}
+               for team in (away, home)]
+
+    return {
+        'boxscore': {
+            'teams': [{'team': {'id': team[0], 'abbreviation': team[1], 'displayName': team[1],
+                                'location': team[1], 'color': '000000'},
+                       'statistics': [{'name': 'firstDowns', 'displayValue': '12'}] * 20,
+                       'homeAway': home_away}
+                      for team, home_away in ((away, 'away'), (home, 'home'))],
+            'players': players,
+        },
+        'format': {'regulation': {'periods': 4}},
+        'gameInfo': {'venue': {'fullName': 'Synthetic Stadium'}, 'attendance': 70000},
+        'drives': {'current': current, 'previous': previous},
+        'leaders': [filler_item] * (filler_count // 8),
+        'header': {
+            'id': game_id,
+            'season': {'year': 2024, 'type': season_type},
+            'week': 5,
+            'competitions': [{
+                'id': game_id,
+                'date': '2024-10-06T17:00Z',
+                'competitors': [{'id': team[0], 'homeAway': home_away,
+                                 'team': {'id': team[0], 'abbreviation': team[1]}, 'score': '0'}
+                                for team, home_away in ((home, 'home'), (away, 'away'))],
+                'status': {'clock': clock_seconds, 'displayClock': f'{clock_seconds // 60}:{clock_seconds % 60:02d}',
+                           'period': period,
+                           'type': {'id': '2', 'name': status, 'state': 'in', 'completed': status == 'STATUS_FINAL'}},
+            }],
+        },
+        'news': {'articles': [filler_item] * (filler_count // 4)},
+        'videos': [filler_item] * (filler_count // 8),
+        'pickcenter': [{'provider': {'name': 'Synthetic'}, 'details': 'KC -3.5', 'overUnder': 47.5}],
+        'standings': {'groups': [filler_item] * (filler_count // 8)},
+    }
+
+
+def make_scoreboard(game_ids, dates):
+    return {'events': [{'id': game_id, 'date': date, 'name': f'Synthetic game {game_id}',
+                        'status': {'type': {'name': 'STATUS_SCHEDULED'}}}
+                       for game_id, date in zip(game_ids, dates)]}
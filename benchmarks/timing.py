@@ -0,0 +1,16 @@
+import timeit
+
+
+def time_per_call(function, repeat=5, number=None):
+    """
+    Best time of one call to a function, in seconds.
+
+    Parameters:
+        function: Callable taking no arguments.
+        repeat: Number of timing rounds; the fastest is reported.
+        number: Calls per round. By default enough for a round to take 0.2s.
+    """
+    timer = timeit.Timer(function)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
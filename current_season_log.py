@@ -0,0 +1,174 @@
+import logging
+import os
+import struct
+import time
+import zlib
+import numpy as np
+
+LOG_MAGIC = b'SIDXLOG1'
+# magic, generation
+LOG_HEADER = struct.Struct('<8sQ')
+# surrender index, crc32 of the packed index
+RECORD = struct.Struct('<dI')
+VALUE = struct.Struct('<d')
+
+logger = logging.getLogger(__name__)
+
+
+class CurrentSeasonLog:
+    """
+    Append-only, fsync'd log of current season surrender indices.
+
+    Every punt appends one fixed-size, checksummed record, so the write cost
+    does not grow with the season. Every `compact_every` records the log is
+    folded into a sorted snapshot and a new log generation is started. A log
+    whose generation is not newer than the snapshot has already been folded in
+    and is ignored, so a crash at any point during compaction is safe. A torn
+    record at the tail of the log is truncated on recovery.
+    """
+
+    def __init__(self, path='current_surrender_indices.log',
+                 snapshot_path='current_surrender_indices.snapshot.npz',
+                 legacy_path='current_surrender_indices.npy',
+                 compact_every=256):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.legacy_path = legacy_path
+        self.compact_every = compact_every
+        self.generation = 0
+        self.values = []
+        self.records_since_compaction = 0
+        self.fd = None
+
+    def load(self):
+        """
+        Recover the current season from the snapshot and log, and open the log for appending.
+
+        Returns:
+            np.ndarray: Every current season surrender index.
+        """
+        self.close()
+        snapshot_generation, snapshot_values = self._load_snapshot()
+        if snapshot_generation is None and not os.path.exists(self.path):
+            snapshot_generation, snapshot_values = self._import_legacy()
+
+        log_generation, log_values = self._recover_log()
+        if log_generation is None or log_generation <= (snapshot_generation or 0):
+            # Missing log, or one that was already folded into the snapshot
+            log_values = []
+            self.generation = (snapshot_generation or 0) + 1
+            self._start_log(self.generation)
+
+        self.values = list(snapshot_values) + log_values
+        self.records_since_compaction = len(log_values)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        return np.array(self.values, dtype=np.float64)
+
+    def append(self, surrender_index):
+        if self.fd is None:
+            self.load()
+        value = VALUE.pack(float(surrender_index))
+        os.write(self.fd, value + struct.pack('<I', zlib.crc32(value)))
+        os.fsync(self.fd)
+        self.values.append(float(surrender_index))
+        self.records_since_compaction += 1
+        if self.compact_every and self.records_since_compaction >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        self._write_snapshot(self.generation, np.sort(np.array(self.values, dtype=np.float64)))
+        self.close()
+        self.generation += 1
+        self._start_log(self.generation)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self.records_since_compaction = 0
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return None, []
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                return int(snapshot['generation']), snapshot['indices'].tolist()
+        except Exception as e:
+            self._quarantine(self.snapshot_path, e)
+            return None, []
+
+    def _import_legacy(self):
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return None, []
+        try:
+            with open(self.legacy_path, 'rb') as f:
+                values = np.sort(np.load(f).astype(np.float64))
+        except Exception as e:
+            self._quarantine(self.legacy_path, e)
+            return None, []
+        self._write_snapshot(0, values)
+        return 0, values.tolist()
+
+    def _recover_log(self):
+        if not os.path.exists(self.path):
+            return None, []
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if len(data) < LOG_HEADER.size:
+            return None, []
+        magic, generation = LOG_HEADER.unpack_from(data)
+        if magic != LOG_MAGIC:
+            self._quarantine(self.path, ValueError("bad log header"))
+            return None, []
+        self.generation = generation
+
+        values = []
+        offset = LOG_HEADER.size
+        while offset + RECORD.size <= len(data):
+            value, crc = RECORD.unpack_from(data, offset)
+            if zlib.crc32(data[offset:offset + VALUE.size]) != crc:
+                break
+            values.append(value)
+            offset += RECORD.size
+
+        if offset != len(data):
+            logger.warning("Truncating %d bytes of torn records from %s", len(data) - offset, self.path)
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+                f.flush()
+                os.fsync(f.fileno())
+        return generation, values
+
+    def _start_log(self, generation):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(LOG_HEADER.pack(LOG_MAGIC, generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._fsync_dir(self.path)
+
+    def _write_snapshot(self, generation, values):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, generation=np.array(generation, dtype=np.int64), indices=values)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir(self.snapshot_path)
+
+    @staticmethod
+    def _quarantine(path, error):
+        # Never drop a season silently: keep the unreadable file for inspection
+        corrupt_path = f"{path}.corrupt-{int(time.time())}"
+        logger.error("Could not read %s (%s), moved it to %s", path, error, corrupt_path)
+        os.replace(path, corrupt_path)
+
+    @staticmethod
+    def _fsync_dir(path):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+import logging
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+logger = logging.getLogger(__name__)
+
+
+class GameFetcher:
+    """
+    Fetches game summaries for every active game concurrently.
+
+    All requests share one pooled, keep-alive session, and a bounded thread
+    pool does the fetching. Games are yielded as their summaries arrive, so a
+    slow response for one game doesn't hold up the others.
+    """
+
+    def __init__(self, max_workers=8, deadline=20):
+        """
+        Parameters:
+            max_workers: Maximum concurrent summary requests. 1 fetches serially.
+            deadline: Seconds to wait for all summaries in a cycle before moving on.
+        """
+        self.max_workers = max_workers
+        self.deadline = deadline
+        self.session = None
+        self.executor = None
+        self.in_flight = {}
+
+    def create_session(self):
+        session = requests.Session()
+        retries = Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
+        adapter = HTTPAdapter(max_retries=retries,
+                              pool_connections=max(self.max_workers, 1),
+                              pool_maxsize=max(self.max_workers, 1))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self.session = session
+        return session
+
+    def fetch_summaries(self, games):
+        """
+        Update the summary of every game.
+
+        Parameters:
+            games: Iterable of NFLGame objects.
+
+        Yields:
+            NFLGame: Each game, as soon as its summary has been fetched. Games
+                whose fetch failed, timed out or is still running from an
+                earlier cycle aren't yielded.
+        """
+        if self.session is None:
+            self.create_session()
+
+        if self.max_workers <= 1:
+            for game in games:
+                try:
+                    game.update_game_summary(self.session)
+                except Exception as e:
+                    logger.warning("Failed to fetch game summary for %s: %s", game.id, e)
+                    continue
+                yield game
+            return
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix='game-fetch')
+
+        futures = {}
+        for game in games:
+            # A fetch that overran the last deadline is still updating this game
+            previous = self.in_flight.get(game.id)
+            if previous is not None and not previous.done():
+                continue
+            future = self.executor.submit(game.update_game_summary, self.session)
+            self.in_flight[game.id] = future
+            futures[future] = game
+
+        try:
+            for future in as_completed(futures, timeout=self.deadline):
+                game = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning("Failed to fetch game summary for %s: %s", game.id, e)
+                    continue
+                yield game
+        except TimeoutError:
+            late_ids = [game.id for future, game in futures.items() if not future.done()]
+            logger.warning("Game summaries still pending after %ss: %s", self.deadline, ', '.join(late_ids))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
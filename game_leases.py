@@ -0,0 +1,71 @@
+import os
+import socket
+
+SHARDING_ROLES = ('standalone', 'coordinator', 'worker')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class GameLeaseManager:
+    """
+    Shares the active games between worker processes through the state store.
+
+    The coordinator publishes the week's games, and every worker leases its
+    fair share of the active ones and renews its leases on every cycle. A
+    worker that stops renewing loses its games to the others once its leases
+    expire. Since a game can move between workers mid-drive, a drive is only
+    posted by the worker that claims it first.
+    """
+
+    def __init__(self, store, worker_id=None, ttl=60):
+        """
+        Parameters:
+            store: StateStore shared by every worker.
+            worker_id: Unique name of this worker.
+            ttl: Seconds a lease stays valid without being renewed.
+        """
+        self.store = store
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl = ttl
+        self.held = set()
+        # (game ID, drive ID) of each claimed drive whose post hasn't been sent or given up yet
+        self.claims = set()
+
+    @property
+    def renew_interval(self):
+        # Renew well before expiry, so one slow cycle doesn't lose every game
+        return self.ttl / 3
+
+    def acquire(self, game_ids):
+        """
+        Parameters:
+            game_ids: IDs of every active game.
+
+        Returns:
+            set: IDs of games newly leased to this worker.
+        """
+        previously_held = self.held
+        self.held = self.store.acquire_leases(self.worker_id, game_ids, self.ttl)
+        if self.claims:
+            self.store.renew_drive_claims(self.worker_id, list(self.claims))
+        return self.held - previously_held
+
+    def holds(self, game_id):
+        return game_id in self.held
+
+    def claim_drive(self, game_id, drive_id):
+        # Posts are queued and retried, so the claim is renewed with the leases until release_drive
+        if not self.store.claim_drive(game_id, drive_id, self.worker_id, self.ttl):
+            return False
+        self.claims.add((game_id, drive_id))
+        return True
+
+    def release_drive(self, game_id, drive_id):
+        # Called once the drive's post is sent or given up
+        self.claims.discard((game_id, drive_id))
+
+    def release(self):
+        self.store.release_leases(self.worker_id)
+        self.held = set()
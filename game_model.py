@@ -0,0 +1,174 @@
+"""
+Compact, parsed representation of an ESPN game summary.
+
+Only the fields used to calculate the Surrender Index and format posts are
+kept; everything else in the summary (boxscore players, leaders, news,
+videos, odds, ...) is dropped as soon as the summary is parsed.
+"""
+
+
+def parse_clock_seconds(display_value):
+    try:
+        minutes, seconds = map(int, display_value.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    return minutes * 60 + seconds
+
+
+class PlayState:
+    """The situation at the start or end of a play."""
+
+    __slots__ = ('team_id', 'possession_text', 'yard_line', 'yards_to_endzone',
+                 'distance', 'down', 'short_down_distance_text')
+
+    def __init__(self, team_id=None, possession_text=None, yard_line=None, yards_to_endzone=None,
+                 distance=None, down=None, short_down_distance_text=None):
+        self.team_id = team_id
+        self.possession_text = possession_text
+        self.yard_line = yard_line
+        self.yards_to_endzone = yards_to_endzone
+        self.distance = distance
+        self.down = down
+        self.short_down_distance_text = short_down_distance_text
+
+    @classmethod
+    def from_dict(cls, state):
+        team_id = state.get('team', {}).get('id')
+        return cls(str(team_id) if team_id is not None else None,
+                   state.get('possessionText'),
+                   state.get('yardLine'),
+                   state.get('yardsToEndzone'),
+                   state.get('distance'),
+                   state.get('down'),
+                   state.get('shortDownDistanceText'))
+
+
+class Play:
+
+    __slots__ = ('id', 'type_text', 'text', 'period', 'clock_display', 'clock_seconds',
+                 'home_score', 'away_score', 'start', 'end')
+
+    def __init__(self, id, type_text, text, period, clock_display, home_score, away_score, start, end):
+        self.id = id
+        self.type_text = type_text
+        self.text = text
+        self.period = period
+        self.clock_display = clock_display
+        self.clock_seconds = parse_clock_seconds(clock_display)
+        self.home_score = home_score
+        self.away_score = away_score
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_dict(cls, play):
+        return cls(play.get('id'),
+                   play.get('type', {}).get('text', ''),
+                   play.get('text', ''),
+                   play.get('period', {}).get('number'),
+                   play.get('clock', {}).get('displayValue'),
+                   play.get('homeScore'),
+                   play.get('awayScore'),
+                   PlayState.from_dict(play.get('start', {})),
+                   PlayState.from_dict(play.get('end', {})))
+
+    @property
+    def team_id(self):
+        return self.start.team_id or self.end.team_id
+
+    def is_punt(self):
+        return 'punt' in self.type_text.lower()
+
+    def with_field_position(self, other):
+        """
+        Copy this play, with the start and end situation of another play.
+
+        Used to score a punt from before a delay of game penalty.
+        """
+        return Play(self.id, self.type_text, self.text, self.period, self.clock_display,
+                    self.home_score, self.away_score, other.start, other.end)
+
+
+class Drive:
+
+    __slots__ = ('id', 'result', 'plays')
+
+    def __init__(self, id, result, plays):
+        self.id = id
+        self.result = result
+        self.plays = plays
+
+    @classmethod
+    def from_dict(cls, drive):
+        return cls(drive.get('id', ''),
+                   drive.get('result'),
+                   [Play.from_dict(play) for play in drive.get('plays', [])])
+
+    def is_punt(self):
+        return 'punt' in (self.result or '').lower()
+
+    @property
+    def fingerprint(self):
+        return (self.result, len(self.plays), self.plays[-1].id if self.plays else None)
+
+
+class GameSummary:
+
+    __slots__ = ('status_name', 'season_type', 'teams', 'home_team', 'away_team',
+                 'previous_drives', 'current_drive', 'season_year', 'week')
+
+    def __init__(self, status_name, season_type, teams, home_team, away_team,
+                 previous_drives, current_drive, season_year=None, week=None):
+        self.status_name = status_name
+        self.season_type = season_type
+        self.season_year = season_year
+        self.week = week
+        self.teams = teams
+        self.home_team = home_team
+        self.away_team = away_team
+        self.previous_drives = previous_drives
+        self.current_drive = current_drive
+
+    @classmethod
+    def from_dict(cls, summary):
+        """
+        Parse a decoded ESPN game summary.
+
+        Parameters:
+            summary(Dict): The summary JSON from the ESPN API.
+
+        Returns:
+            GameSummary: The parsed summary.
+        """
+        header = summary.get('header', {})
+        status_name = header.get('competitions', [{}])[0].get('status', {}).get('type', {}).get('name')
+        season_type = header.get('season', {}).get('type', 0)
+        season_year = header.get('season', {}).get('year')
+        week = header.get('week')
+
+        # The boxscore lists the away team first and the home team second
+        boxscore_teams = [team.get('team', {}) for team in summary.get('boxscore', {}).get('teams', [])]
+        teams = {str(team.get('id')): team.get('abbreviation') for team in boxscore_teams}
+        away_team = boxscore_teams[0].get('abbreviation') if len(boxscore_teams) > 0 else None
+        home_team = boxscore_teams[1].get('abbreviation') if len(boxscore_teams) > 1 else None
+
+        drives = summary.get('drives', {})
+        previous_drives = [Drive.from_dict(drive) for drive in drives.get('previous', [])]
+        current_drive = Drive.from_dict(drives['current']) if drives.get('current') else None
+
+        return cls(status_name, season_type, teams, home_team, away_team, previous_drives, current_drive,
+                   season_year, week)
+
+    def get_possessing_team(self, play):
+        return self.teams.get(play.team_id)
+
+    def return_other_team(self, team):
+        return self.away_team if self.home_team == team else self.home_team
+
+    @property
+    def last_play(self):
+        if self.current_drive and self.current_drive.plays:
+            return self.current_drive.plays[-1]
+        if self.previous_drives and self.previous_drives[-1].plays:
+            return self.previous_drives[-1].plays[-1]
+        return None
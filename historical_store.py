@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import numpy as np
+
+MAGIC = b'SIDXSORT'
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct('<8sII')
+# Data starts on a page-friendly boundary so it can be mapped directly
+ALIGNMENT = 64
+QUANTILES = [0., 1., 5., 10., 25., 50., 75., 90., 95., 99., 99.9, 100.]
+
+
+class HistoricalIndexStore:
+    """
+    Sorted, memory-mapped store of historical surrender indices.
+
+    The store file holds a small JSON header (count, season range, checksum,
+    quantiles and the source file it was built from) followed by the sorted
+    indices as little-endian float64. The array is opened read-only with mmap,
+    so every bot process on the host shares the same page cache pages.
+    """
+
+    def __init__(self, path='1999-2024_surrender_indices.sidx',
+                 source_path='1999-2024_surrender_indices.npy'):
+        self.path = path
+        self.source_path = source_path
+        self._header = None
+        self._indices = None
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._open()
+        return self._header
+
+    @property
+    def indices(self):
+        if self._indices is None:
+            self._open()
+        return self._indices
+
+    @property
+    def count(self):
+        return self.header['count']
+
+    @property
+    def quantiles(self):
+        return {float(q): value for q, value in self.header['quantiles'].items()}
+
+    def _open(self):
+        if self.is_stale():
+            self.build()
+        header, data_offset = self.read_header(self.path)
+        if header['count'] == 0:
+            self._indices = np.array([], dtype='<f8')
+        else:
+            self._indices = np.memmap(self.path, dtype='<f8', mode='r',
+                                      offset=data_offset, shape=(header['count'],))
+        self._header = header
+
+    def is_stale(self):
+        if not os.path.exists(self.path):
+            return True
+        try:
+            header, data_offset = self.read_header(self.path)
+        except ValueError:
+            return True
+        if os.path.getsize(self.path) != data_offset + header['count'] * 8:
+            return True
+        if self.source_path and os.path.exists(self.source_path):
+            source_stat = os.stat(self.source_path)
+            source = header.get('source', {})
+            return (source.get('size') != source_stat.st_size
+                    or source.get('mtime_ns') != source_stat.st_mtime_ns)
+        return False
+
+    def build(self, indices=None, first_season=None, last_season=None):
+        """
+        Write the store from an array of indices, or from the source .npy file.
+
+        Parameters:
+            indices: Optional array of surrender indices already written to the source file.
+                     Defaults to loading the source file.
+            first_season: First season in the data. Parsed from the source name if omitted.
+            last_season: Last season in the data. Parsed from the source name if omitted.
+        """
+        if indices is None:
+            with open(self.source_path, 'rb') as f:
+                indices = np.load(f)
+        source = {}
+        if self.source_path and os.path.exists(self.source_path):
+            source_stat = os.stat(self.source_path)
+            source = {'path': os.path.basename(self.source_path),
+                      'size': source_stat.st_size,
+                      'mtime_ns': source_stat.st_mtime_ns}
+        if first_season is None or last_season is None:
+            first_season, last_season = self.parse_season_range(self.source_path)
+
+        sorted_indices = np.sort(np.asarray(indices, dtype='<f8'))
+        data = sorted_indices.tobytes()
+        header = {
+            'count': int(sorted_indices.size),
+            'first_season': first_season,
+            'last_season': last_season,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'quantiles': {str(q): float(np.percentile(sorted_indices, q)) if sorted_indices.size else None
+                          for q in QUANTILES},
+            'source': source,
+        }
+        header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+        padding = -(PREAMBLE.size + len(header_bytes)) % ALIGNMENT
+        header_bytes += b' ' * padding
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._header = None
+        self._indices = None
+
+    def verify(self):
+        return hashlib.sha256(np.ascontiguousarray(self.indices).tobytes()).hexdigest() == self.header['sha256']
+
+    @staticmethod
+    def read_header(path):
+        with open(path, 'rb') as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) != PREAMBLE.size:
+                raise ValueError(f"{path} is too short to be a surrender index store")
+            magic, version, header_length = PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a surrender index store")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported surrender index store version {version}")
+            header = json.loads(f.read(header_length))
+        return header, PREAMBLE.size + header_length
+
+    @staticmethod
+    def parse_season_range(path):
+        match = re.search(r'(\d{4})-(\d{4})', os.path.basename(path or ''))
+        if not match:
+            return None, None
+        return int(match.group(1)), int(match.group(2))
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Persistent queue of delayed jobs run on a bounded worker pool.
+
+    Jobs are identified by a kind with a registered handler and a
+    JSON-serializable payload. Pending jobs are saved in the state store
+    whenever they change, so they resume after a restart. A failed job is
+    retried with exponential backoff up to `max_attempts` times.
+
+    With a `refresh_interval`, jobs that other processes saved to the store
+    are picked up every `refresh_interval` seconds, so one queue can run the
+    jobs scheduled by every sharded worker.
+    """
+
+    def __init__(self, store, max_workers=4, max_attempts=3, refresh_interval=None):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.refresh_interval = refresh_interval
+        self.last_refresh = 0
+        self.handlers = {}
+        self.jobs = {}
+        self.heap = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.executor = None
+        self.thread = None
+        self.running = False
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def schedule(self, kind, payload, delay=0):
+        """
+        Schedule a job to run after a delay.
+
+        Parameters:
+            kind: The name of a registered handler.
+            payload: JSON-serializable dict passed to the handler.
+            delay: Seconds to wait before running the job.
+
+        Returns:
+            str: The job's ID.
+        """
+        job = {'id': uuid.uuid4().hex, 'kind': kind, 'payload': payload,
+               'run_at': time.time() + delay, 'attempts': 0}
+        self.store.save_job(job)
+        with self.condition:
+            self._push(job)
+            self.condition.notify()
+        return job['id']
+
+    def pending_count(self):
+        with self.condition:
+            return len(self.jobs)
+
+    def refresh(self):
+        # Called with the condition held. Finished jobs are deleted from the
+        # store before they leave self.jobs, so they're never loaded again.
+        for job in self.store.load_jobs():
+            if job['id'] not in self.jobs:
+                self._push(job)
+        self.last_refresh = time.time()
+
+    def start(self):
+        with self.condition:
+            self.refresh()
+            self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self.thread = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _push(self, job):
+        self.jobs[job['id']] = job
+        heapq.heappush(self.heap, (job['run_at'], next(self.counter), job['id']))
+
+    def _dispatch(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    if self.refresh_interval is not None and \
+                            time.time() - self.last_refresh >= self.refresh_interval:
+                        self.refresh()
+                    if self.heap:
+                        wait_time = self.heap[0][0] - time.time()
+                        if wait_time <= 0:
+                            break
+                    else:
+                        wait_time = None
+                    if self.refresh_interval is not None:
+                        wait_time = min(self.refresh_interval, wait_time if wait_time is not None
+                                        else self.refresh_interval)
+                    self.condition.wait(wait_time)
+                if not self.running:
+                    return
+                _, _, job_id = heapq.heappop(self.heap)
+                job = self.jobs.get(job_id)
+            if job is not None:
+                self.executor.submit(self._execute, job)
+
+    def _execute(self, job):
+        handler = self.handlers.get(job['kind'])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind {job['kind']}")
+            handler(job['payload'])
+        except Exception:
+            logger.exception("Job %s raised", job['kind'])
+            with self.condition:
+                job['attempts'] += 1
+                if job['attempts'] < self.max_attempts:
+                    job['run_at'] = time.time() + 30 * 2 ** (job['attempts'] - 1)
+                    heapq.heappush(self.heap, (job['run_at'], next(self.counter), job['id']))
+                    self.store.save_job(job)
+                    logger.warning("Job %s failed, retrying in %.0fs", job['kind'], job['run_at'] - time.time())
+                else:
+                    logger.error("Job %s failed %d times, giving up", job['kind'], job['attempts'])
+                    del self.jobs[job['id']]
+                    self.store.delete_job(job['id'])
+                self.condition.notify()
+            return
+
+        self.store.delete_job(job['id'])
+        with self.condition:
+            self.jobs.pop(job['id'], None)
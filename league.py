@@ -0,0 +1,72 @@
+import os
+import re
+
+ESPN_API_ROOT = "http://site.api.espn.com/apis/site/v2/sports"
+
+
+class League:
+    """
+    Everything that differs between the leagues the bot follows: where their
+    games come from, which historical indices they're compared to and which
+    accounts their punts are posted to.
+    """
+
+    def __init__(self, key, name, path, historical_name, main_config, ninety_config,
+                 scoreboard_params=None, punt_store_path=None):
+        """
+        Parameters:
+            key: Short identifier, e.g. nfl.
+            name: Display name.
+            path: Path of the league under the ESPN API root, e.g. football/nfl.
+            historical_name: Name of the historical index files, which
+                rebuild_historical.py writes as <first>-<last>_<name>.npy.
+            main_config: Config file of the account every punt is posted to.
+            ninety_config: Config file of the account that boosts the worst punts.
+            scoreboard_params: Extra query parameters for the scoreboard request.
+            punt_store_path: Directory of the per-punt store.
+        """
+        self.key = key
+        self.name = name
+        self.path = path
+        self.historical_name = historical_name
+        self.main_config = main_config
+        self.ninety_config = ninety_config
+        self.scoreboard_params = scoreboard_params or {}
+        self.punt_store_path = punt_store_path or f"{key}_punts"
+
+    def base_url(self, api_root=ESPN_API_ROOT):
+        return f"{api_root.rstrip('/')}/{self.path}"
+
+    def historical_file_name(self, first_season, last_season):
+        return f"{first_season}-{last_season}_{self.historical_name}.npy"
+
+    @property
+    def historical_source_path(self):
+        """
+        Returns:
+            str: The .npy file with the latest seasons, so the bot reads a new
+                 rebuild without any settings changing, or <name>.npy if
+                 there is none.
+        """
+        pattern = re.compile(r'(\d{4})-(\d{4})_' + re.escape(self.historical_name) + r'\.npy')
+        rebuilds = []
+        for file_name in os.listdir('.'):
+            match = pattern.fullmatch(file_name)
+            if match:
+                first_season, last_season = int(match.group(1)), int(match.group(2))
+                rebuilds.append((last_season, -first_season, file_name))
+        return max(rebuilds)[2] if rebuilds else f"{self.historical_name}.npy"
+
+    def __repr__(self):
+        return f"League({self.key})"
+
+
+LEAGUES = {
+    'nfl': League('nfl', 'NFL', 'football/nfl', 'surrender_indices',
+                  'config.toml', 'ninety_config.toml'),
+    # Without groups, the college scoreboard only lists ranked teams' games.
+    # 80 is every FBS conference.
+    'ncaaf': League('ncaaf', 'NCAA', 'football/college-football', 'ncaaf_surrender_indices',
+                    'ncaaf_config.toml', 'ncaaf_ninety_config.toml',
+                    scoreboard_params={'groups': '80', 'limit': '400'}),
+}
@@ -1,28 +1,151 @@
-from mastodon import Mastodon
+import itertools
+import json
+import logging
 import os
+import threading
+import time
 import toml
+from metrics import MASTODON_RATE_LIMIT_WAIT_SECONDS, timed_mastodon_call
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    """The server refused a call until `reset_at` (epoch seconds)."""
+
+    def __init__(self, reset_at):
+        super().__init__(f"Rate limited until {reset_at:.0f}")
+        self.reset_at = reset_at
+
+
+class TokenBucket:
+    """
+    Paces the calls made with one account.
+
+    Tokens refill at `limit` per `period` seconds, Mastodon's default being
+    300 calls per 5 minutes. After every call the bucket is corrected with
+    the X-RateLimit headers of the response, so calls made elsewhere with the
+    same token are counted too. Once the server says none are left, no
+    token refills until its window resets and every token is back.
+    """
+
+    def __init__(self, limit=300, period=300):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit)
+        self.updated_at = time.time()
+        # When the server's current window ends, from the last response
+        self.reset_at = None
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.reset_at is not None and now >= self.reset_at:
+            self.tokens = float(self.limit)
+            self.reset_at = None
+            self.exhausted = False
+        elif not self.exhausted:
+            self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.limit / self.period)
+        self.updated_at = now
+
+    def acquire(self):
+        """
+        Take a token, waiting for one if there are none left.
+
+        Returns:
+            float: Seconds waited.
+        """
+        waited = 0.
+        while True:
+            with self.lock:
+                now = time.time()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_time = (1 - self.tokens) * self.period / self.limit
+                if self.reset_at is not None:
+                    wait_time = min(wait_time, self.reset_at - now)
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def update(self, limit, remaining, reset_at):
+        """Correct the bucket with the server's X-RateLimit headers."""
+        with self.lock:
+            now = time.time()
+            self._refill(now)
+            if limit:
+                self.limit = limit
+            self.tokens = min(self.tokens, remaining)
+            if reset_at > now:
+                self.reset_at = reset_at
+                self.exhausted = remaining <= 0
+
 
 class MastodonBot:
+    """
+    A Mastodon account. The config is read and the account logged in on the
+    first API call, so a bot that never posts never connects.
+
+    Calls wait for the account's TokenBucket instead of Mastodon.py's own
+    rate limiting, which would sleep while holding no lock and without
+    telling the caller; a refused call raises RateLimited.
+    """
 
     def __init__(self, config_path='config.toml') -> None:
-        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_path)
-        with open(config_path, 'r') as config_file:
-            self.config = toml.load(config_file)
-            self.server = self.config.get("server")
-            self.access_token = self.config.get("access_token")
-            self.mastodon = self.login()
+        self.config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_path)
+        self.config = None
+        self.server = None
+        self.access_token = None
+        self._mastodon = None
+        self.lock = threading.Lock()
+        self.rate_limit = TokenBucket()
+
+    @property
+    def mastodon(self):
+        # Delayed jobs can make the first call from several threads at once
+        with self.lock:
+            if self._mastodon is None:
+                self._mastodon = self.login()
+            return self._mastodon
 
     def login(self):
-        print("Logged in")
-        return Mastodon(access_token=self.access_token, api_base_url=self.server)
+        # Mastodon.py is slow to import, so it's only imported by bots that post
+        from mastodon import Mastodon
 
-    def post(self, message, reply_id=None, poll=None):
-        print("Posting status...")
-        return self.mastodon.status_post(message, in_reply_to_id=reply_id, poll=poll, language='en')
+        with open(self.config_path, 'r') as config_file:
+            self.config = toml.load(config_file)
+        self.server = self.config.get("server")
+        self.access_token = self.config.get("access_token")
+        mastodon = Mastodon(access_token=self.access_token, api_base_url=self.server, ratelimit_method='throw')
+        logger.info("Logged in to %s", self.server)
+        return mastodon
+
+    def call(self, method, function_name, *args, **kwargs):
+        mastodon = self.mastodon
+        waited = self.rate_limit.acquire()
+        if waited > 0:
+            logger.info("Waited %.1fs for the rate limit of %s", waited, self.server)
+            MASTODON_RATE_LIMIT_WAIT_SECONDS.inc(waited)
+        try:
+            return timed_mastodon_call(method, getattr(mastodon, function_name), *args, **kwargs)
+        except Exception as error:
+            from mastodon import MastodonRatelimitError
+            if isinstance(error, MastodonRatelimitError):
+                self.rate_limit.update(mastodon.ratelimit_limit, 0, mastodon.ratelimit_reset)
+                raise RateLimited(mastodon.ratelimit_reset) from error
+            raise
+        finally:
+            self.rate_limit.update(mastodon.ratelimit_limit, mastodon.ratelimit_remaining, mastodon.ratelimit_reset)
+
+    def post(self, message, reply_id=None, poll=None, idempotency_key=None):
+        logger.debug("Posting status")
+        return self.call('post', 'status_post', message, in_reply_to_id=reply_id, poll=poll, language='en',
+                         idempotency_key=idempotency_key)
     
     def get_poll_result(self, poll_id):
-        print("Getting poll result")
-        poll_status = self.mastodon.status(poll_id)
+        logger.debug("Getting poll result for %s", poll_id)
+        poll_status = self.call('status', 'status', poll_id)
         return poll_status.poll["options"]
 
     def make_simple_poll(self, options=[], hide_totals=False, expires_in=60*60):
@@ -31,15 +154,82 @@ class MastodonBot:
         )
     
     def delete_status(self, status_id):
-        print(f"Deleting status with ID: {status_id}")
-        return self.mastodon.status_delete(status_id)
+        logger.debug("Deleting status with ID: %s", status_id)
+        return self.call('delete', 'status_delete', status_id)
 
     def boost(self, status_id):
-        print(f"Boosting status with ID: {status_id}")
-        return self.mastodon.status_reblog(status_id)
+        logger.debug("Boosting status with ID: %s", status_id)
+        return self.call('boost', 'status_reblog', status_id)
 
     def unboost(self, status_id):
-        print(f"Unboosting status with ID: {status_id}")
-        return self.mastodon.status_unreblog(status_id)
+        logger.debug("Unboosting status with ID: %s", status_id)
+        return self.call('unboost', 'status_unreblog', status_id)
+
+        
+
+class FakeMastodonBot:
+    """
+    In-process stand-in for MastodonBot that records every post, boost and
+    poll instead of sending them, for replays and benchmarks.
+    """
+
+    def __init__(self, name='main', log_path=None, latency=0) -> None:
+        """
+        Parameters:
+            name: Account name recorded with each event.
+            log_path: Optional JSON lines file that every event is appended to.
+            latency: Seconds each post and boost takes, to stand in for a slow instance.
+        """
+        self.name = name
+        self.log_path = log_path
+        self.latency = latency
+        self.events = []
+        self.statuses = {}
+        self.idempotency_keys = {}
+        self.lock = threading.Lock()
+        self.next_id = itertools.count(1)
+
+    def record(self, action, **fields):
+        event = dict(account=self.name, action=action, time=time.time(), **fields)
+        with self.lock:
+            self.events.append(event)
+            if self.log_path:
+                with open(self.log_path, 'a') as log_file:
+                    log_file.write(json.dumps(event) + '\n')
+        return event
+
+    def post(self, message, reply_id=None, poll=None, idempotency_key=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            # Like Mastodon, a retried post with the same key returns the first status
+            if idempotency_key in self.idempotency_keys:
+                return self.statuses[self.idempotency_keys[idempotency_key]]
+            status = {'id': f'{self.name}-{next(self.next_id)}', 'content': message,
+                      'in_reply_to_id': reply_id, 'poll': poll}
+            self.statuses[status['id']] = status
+            if idempotency_key is not None:
+                self.idempotency_keys[idempotency_key] = status['id']
+        self.record('post', status_id=status['id'], text=message, reply_id=reply_id, has_poll=poll is not None)
+        return status
+
+    def get_poll_result(self, poll_id):
+        self.record('poll_result', status_id=poll_id)
+        poll = (self.statuses.get(poll_id) or {}).get('poll') or {}
+        return poll.get('options', [])
+
+    def make_simple_poll(self, options=[], hide_totals=False, expires_in=60*60):
+        return {'options': [{'title': option, 'votes_count': 0} for option in options],
+                'expires_in': expires_in}
+
+    def delete_status(self, status_id):
+        self.statuses.pop(status_id, None)
+        self.record('delete', status_id=status_id)
+
+    def boost(self, status_id):
+        if self.latency:
+            time.sleep(self.latency)
+        self.record('boost', status_id=status_id)
 
-        
\ No newline at end of file
+    def unboost(self, status_id):
+        self.record('unboost', status_id=status_id)
@@ -0,0 +1,126 @@
+"""
+Prometheus metrics for the bot's hot paths.
+
+Metrics can be scraped from an HTTP endpoint (--metricsPort) or written
+periodically to a file in the Prometheus text format (--metricsFile), e.g.
+for node_exporter's textfile collector.
+"""
+
+import logging
+import threading
+import time
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, start_http_server, write_to_textfile
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = CollectorRegistry()
+
+FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)
+REQUEST_BUCKETS = (.025, .05, .1, .25, .5, 1, 2.5, 5, 10, 20)
+LATENCY_BUCKETS = (1, 5, 10, 15, 30, 45, 60, 90, 120, 180, 300, 600)
+QUEUE_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+FETCH_SECONDS = Histogram('surrender_index_fetch_seconds', "Time to fetch one game summary",
+                          ['outcome'], buckets=REQUEST_BUCKETS, registry=REGISTRY)
+DECODE_SECONDS = Histogram('surrender_index_decode_seconds', "Time to decode and parse one game summary",
+                           buckets=FAST_BUCKETS, registry=REGISTRY)
+SCAN_SECONDS = Histogram('surrender_index_scan_seconds', "Time to scan one game for punts",
+                         buckets=FAST_BUCKETS, registry=REGISTRY)
+CYCLE_SECONDS = Histogram('surrender_index_cycle_seconds', "Time to fetch and scan every due game",
+                          buckets=REQUEST_BUCKETS, registry=REGISTRY)
+PUNT_POST_LATENCY_SECONDS = Histogram('surrender_index_punt_post_latency_seconds',
+                                      "Time from a punt first being seen to it being posted",
+                                      buckets=LATENCY_BUCKETS, registry=REGISTRY)
+PUNTS_POSTED = Counter('surrender_index_punts_posted', "Punts posted", registry=REGISTRY)
+MASTODON_CALL_SECONDS = Histogram('surrender_index_mastodon_call_seconds', "Time of one Mastodon API call",
+                                  ['method'], buckets=REQUEST_BUCKETS, registry=REGISTRY)
+MASTODON_ERRORS = Counter('surrender_index_mastodon_errors', "Failed Mastodon API calls",
+                          ['method'], registry=REGISTRY)
+MASTODON_RATE_LIMIT_WAIT_SECONDS = Counter('surrender_index_mastodon_rate_limit_wait_seconds',
+                                           "Time spent waiting for Mastodon rate limits", registry=REGISTRY)
+POST_QUEUE_DEPTH = Gauge('surrender_index_post_queue_depth', "Mastodon calls queued or running in the posting pipeline",
+                         registry=REGISTRY)
+POST_QUEUE_SECONDS = Histogram('surrender_index_post_queue_seconds',
+                               "Time from a Mastodon call being queued to it succeeding, retries included",
+                               ['method'], buckets=QUEUE_BUCKETS, registry=REGISTRY)
+POST_RETRIES = Counter('surrender_index_post_retries', "Mastodon calls retried by the posting pipeline",
+                       ['method'], registry=REGISTRY)
+STARTUP_SECONDS = Gauge('surrender_index_startup_seconds', "Time spent in each phase of the last startup",
+                        ['phase'], registry=REGISTRY)
+
+
+def timed_mastodon_call(method, function, *args, **kwargs):
+    with MASTODON_CALL_SECONDS.labels(method).time():
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            MASTODON_ERRORS.labels(method).inc()
+            raise
+
+
+class StartupTimer:
+    """
+    Times consecutive startup phases, and logs the breakdown once the first
+    polling cycle is done.
+    """
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.last = self.start
+        self.phases = []
+        self.finished = False
+
+    def mark(self, phase):
+        """Record the time since the previous mark as `phase`."""
+        if self.finished:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        STARTUP_SECONDS.labels(phase).set(now - self.last)
+        self.last = now
+
+    def finish(self, phase):
+        if self.finished:
+            return
+        self.mark(phase)
+        self.finished = True
+        STARTUP_SECONDS.labels('total').set(self.last - self.start)
+        logger.info("Started in %.0fms (%s)", (self.last - self.start) * 1000,
+                    ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases))
+
+
+def start_metrics_server(port):
+    start_http_server(port, registry=REGISTRY)
+    logger.info("Serving metrics on port %d", port)
+
+
+class MetricsFileWriter:
+    """Writes every metric to a file in the Prometheus text format on an interval."""
+
+    def __init__(self, path, interval=15):
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def write(self):
+        # write_to_textfile writes a temporary file and renames it into place
+        write_to_textfile(self.path, REGISTRY)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='metrics-file', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
@@ -1,13 +1,37 @@
 from dateutil import parser, tz
+import hashlib
 from datetime import timezone, timedelta, datetime
-import pytz 
+import logging
+import time
+from game_model import GameSummary
+from league import ESPN_API_ROOT, LEAGUES
+from metrics import DECODE_SECONDS, FETCH_SECONDS
+from summary_decoder import decode_summary
 
-class NFLGame:
+logger = logging.getLogger(__name__)
 
-    game_summary = {}
+class NFLGame:
 
-    def __init__(self, event_info):
+    def __init__(self, event_info, league=LEAGUES['nfl'], api_root=ESPN_API_ROOT):
         self.event_info = event_info
+        self.league = league
+        self.base_url = league.base_url(api_root)
+        self._game_time = None
+        self.summary = None
+        self.etag = None
+        self.last_modified = None
+        self.summary_digest = None
+        # Set when a fetch gets a new summary, and cleared once it's scanned, so a
+        # fetch that finishes after its cycle's deadline is still scanned next cycle
+        self.summary_changed = False
+        # Cycles fetched, and cycles short-circuited before JSON decoding
+        self.fetch_count = 0
+        self.not_modified_count = 0
+        self.unchanged_count = 0
+        # Previous drives before the cursor are finalized and never rescanned
+        self.drive_cursor = 0
+        self.finalized_drive_ids = set()
+        self.drive_fingerprints = {}
 
     def get_now(self):
         return datetime.now(tz=tz.gettz())
@@ -18,8 +42,17 @@ class NFLGame:
  
     @property
     def game_time(self):
-        game_date = parser.parse(self.event_info['date'])
-        return game_date.replace(tzinfo=timezone.utc).astimezone(tz=None)
+        # Parsed once, since every active game is checked on every cycle
+        if self._game_time is None:
+            game_date = parser.parse(self.event_info['date'])
+            self._game_time = game_date.replace(tzinfo=timezone.utc).astimezone(tz=None)
+        return self._game_time
+
+    def update_event_info(self, event_info):
+        # Flexed and delayed games keep their fetch and scan state, with the new kickoff
+        if event_info.get('date') != self.event_info.get('date'):
+            self._game_time = None
+        self.event_info = event_info
 
     @property
     def is_starting_soon(self):
@@ -27,38 +60,94 @@ class NFLGame:
         return self.game_time - timedelta(minutes=15) < now < self.game_time + timedelta(hours=6)
 
     @property
-    def drives(self):
-        return self.game_summary.get('drives', {}) if self.game_summary else {}
+    def status_name(self):
+        return self.summary.status_name if self.summary else None
 
     @property
     def is_final(self):
-        return (
-            self.game_summary.get('header', {}).get('competitions', [{}])[0].get('status', {}).get('type', {}).get('name') == 'STATUS_FINAL'
-        )
+        return self.status_name == 'STATUS_FINAL'
 
     @property
     def is_postseason(self):
-        return self.game_summary.get('header', {}).get('season', {}).get('type', 0) > 2
+        return bool(self.summary) and self.summary.season_type > 2
 
-        
     @property
     def previous_drives(self):
-        return self.drives.get('previous', [])
+        return self.summary.previous_drives if self.summary else []
+
+    @property
+    def last_play(self):
+        return self.summary.last_play if self.summary else None
+
+    @property
+    def home_team(self):
+        return self.summary.home_team
+
+    @property
+    def away_team(self):
+        return self.summary.away_team
+
+    @property
+    def short_circuit_count(self):
+        return self.not_modified_count + self.unchanged_count
+
+    def reset_drive_cursor(self):
+        self.drive_cursor = 0
+        self.finalized_drive_ids = set()
+        self.drive_fingerprints = {}
 
     def update_game_summary(self, session):
         """
         Update the game summary from the ESPN API.
 
+        Sends a conditional request when ESPN gave us an ETag or Last-Modified
+        header, and otherwise compares a hash of the raw response, so an
+        unchanged summary is never decoded.
+
         Parameters:
             session: An active requests.Session object for making the API call.
+
+        Returns:
+            bool: True if the summary changed since the last update.
+
+        Raises:
+            requests.RequestException: The summary couldn't be fetched.
+            ValueError: The response isn't a game summary.
         """
-        base_link = "http://site.api.espn.com/apis/site/v2/sports/football/nfl/summary?event="
-        game_link = f"{base_link}{self.id}"
+        game_link = f"{self.base_url}/summary?event={self.id}"
 
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+
+        start_time = time.perf_counter()
+        outcome = 'error'
         try:
-            response = session.get(game_link, timeout=10)
+            response = session.get(game_link, headers=headers, timeout=10)
+            self.fetch_count += 1
+            if response.status_code == 304:
+                self.not_modified_count += 1
+                outcome = 'not_modified'
+                return False
             response.raise_for_status()  # Raise an error for bad responses
-            self.game_summary = response.json()
 
-        except requests.RequestException as e:
-            print(f"An error occurred while fetching game summary: {e}")
\ No newline at end of file
+            digest = hashlib.blake2b(response.content, digest_size=16).digest()
+            if digest == self.summary_digest:
+                self.unchanged_count += 1
+                outcome = 'unchanged'
+                return False
+
+            # Only the parts of the payload the bot reads are decoded
+            with DECODE_SECONDS.time():
+                self.summary = GameSummary.from_dict(decode_summary(response.content))
+            # Kept only once the summary is decoded, so a bad body isn't answered with a 304 next time
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+            self.summary_digest = digest
+            self.summary_changed = True
+            outcome = 'changed'
+            return True
+        finally:
+            FETCH_SECONDS.labels(outcome).observe(time.perf_counter() - start_time)
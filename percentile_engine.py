@@ -0,0 +1,81 @@
+from bisect import bisect_left, insort
+import numpy as np
+from quantile_sketch import TDigest
+
+
+class PercentileEngine:
+    """
+    In-memory percentile lookups over the historical and current season
+    Surrender Index distributions.
+
+    Both distributions are kept sorted so every query is a binary search.
+    Results match scipy.stats.percentileofscore(..., kind='strict').
+    """
+
+    def __init__(self, historical_indices=None, current_indices=None, presorted=False):
+        """
+        Parameters:
+            historical_indices: Array-like of historical surrender indices.
+            current_indices: Array-like of current season surrender indices.
+            presorted: Skip sorting the historical indices if they are already sorted.
+        """
+        if historical_indices is None:
+            historical_indices = np.array([], dtype=np.float64)
+        if presorted:
+            self.historical = historical_indices
+        else:
+            self.historical = np.sort(np.asarray(historical_indices, dtype=np.float64))
+        self.current = sorted(float(index) for index in (current_indices if current_indices is not None else []))
+
+    @staticmethod
+    def _percentile(count_below, total):
+        # Same arithmetic as scipy so results are bit-for-bit identical
+        if total == 0:
+            return np.nan
+        return count_below * (100.0 / total)
+
+    def count_historical_below(self, surrender_index):
+        return int(np.searchsorted(self.historical, surrender_index, side='left'))
+
+    def count_current_below(self, surrender_index):
+        return bisect_left(self.current, surrender_index)
+
+    def current_percentile(self, surrender_index):
+        return self._percentile(self.count_current_below(surrender_index), len(self.current))
+
+    def combined_percentile(self, surrender_index):
+        count_below = self.count_historical_below(surrender_index) + self.count_current_below(surrender_index)
+        return self._percentile(count_below, len(self.historical) + len(self.current))
+
+    def add(self, surrender_index):
+        insort(self.current, float(surrender_index))
+
+class SketchPercentileEngine(PercentileEngine):
+    """
+    Percentile lookups over t-digests of the historical and current season
+    distributions, in bounded memory.
+
+    Results are estimates of percentileofscore(..., kind='strict'); see
+    benchmarks/run.py for their error against the exact engine.
+    """
+
+    def __init__(self, historical_sketch=None, current_indices=None, compression=200):
+        """
+        Parameters:
+            historical_sketch: TDigest of the historical surrender indices.
+            current_indices: Array-like of current season surrender indices.
+            compression: Compression of the current season's digest.
+        """
+        self.historical = historical_sketch if historical_sketch is not None else TDigest(compression)
+        self.current = TDigest(compression)
+        if current_indices is not None:
+            self.current.add_many(current_indices)
+
+    def count_historical_below(self, surrender_index):
+        return self.historical.count_below(surrender_index)
+
+    def count_current_below(self, surrender_index):
+        return self.current.count_below(surrender_index)
+
+    def add(self, surrender_index):
+        self.current.add(surrender_index)
@@ -0,0 +1,98 @@
+import time
+
+# Game statuses where nothing can happen for a while
+IDLE_STATUSES = {'STATUS_HALFTIME', 'STATUS_SCHEDULED', 'STATUS_DELAYED'}
+BREAK_STATUSES = {'STATUS_END_PERIOD'}
+
+
+class PollScheduler:
+    """
+    Decides when each active game's summary should be fetched next.
+
+    Games are polled quickly when a punt is likely (4th down, or 3rd down
+    that could become one) or when a punt is waiting to be confirmed, and
+    polled slowly during halftime, breaks between quarters and early downs.
+    Games whose summary couldn't be fetched back off from `min_interval`,
+    doubling up to `max_interval`, until a fetch succeeds.
+    """
+
+    def __init__(self, min_interval=5, max_interval=120, default_interval=30):
+        """
+        Parameters:
+            min_interval: Fastest polling interval in seconds.
+            max_interval: Slowest polling interval in seconds.
+            default_interval: Interval for ordinary game situations.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.next_poll_times = {}
+        # Game ID -> fetches failed in a row
+        self.failures = {}
+
+    def clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def interval_for(self, game, has_pending_confirmation=False):
+        if has_pending_confirmation:
+            return self.min_interval
+
+        status = game.status_name
+        if status in IDLE_STATUSES:
+            return self.max_interval
+        if status in BREAK_STATUSES:
+            return self.clamp(self.default_interval * 2)
+        if status == 'STATUS_FINAL':
+            return self.clamp(self.default_interval)
+
+        play = game.last_play
+        if not play:
+            return self.clamp(self.default_interval)
+        if play.is_punt():
+            return self.min_interval
+
+        down = play.end.down or play.start.down
+        if down == 4:
+            return self.min_interval
+        if down == 3:
+            return self.clamp(self.default_interval / 2)
+        if down == 1:
+            return self.clamp(self.default_interval * 1.5)
+        return self.clamp(self.default_interval)
+
+    def schedule(self, game, has_pending_confirmation=False, now=None):
+        now = time.time() if now is None else now
+        interval = self.interval_for(game, has_pending_confirmation)
+        self.next_poll_times[game.id] = now + interval
+        self.failures.pop(game.id, None)
+        return interval
+
+    def schedule_failed(self, game, now=None):
+        """Schedule a game whose fetch failed, was skipped or timed out."""
+        now = time.time() if now is None else now
+        failures = self.failures.get(game.id, 0) + 1
+        self.failures[game.id] = failures
+        interval = self.clamp(self.min_interval * 2 ** (failures - 1))
+        self.next_poll_times[game.id] = now + interval
+        return interval
+
+    def schedule_missed(self, games, due_time):
+        """
+        Back off the games due at `due_time` that haven't been scheduled
+        since, including games never scheduled before, so they're due again
+        after the backoff rather than on every pass.
+        """
+        for game in games:
+            if self.next_poll_times.get(game.id, due_time) <= due_time:
+                self.schedule_failed(game)
+
+    def due_games(self, games, now=None):
+        now = time.time() if now is None else now
+        return [game for game in games if self.next_poll_times.get(game.id, 0) <= now]
+
+    def seconds_until_next_poll(self, games, now=None):
+        now = time.time() if now is None else now
+        next_times = [self.next_poll_times.get(game.id, 0) for game in games]
+        if not next_times:
+            return self.max_interval
+        return min(max(min(next_times) - now, 0), self.max_interval)
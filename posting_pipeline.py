@@ -0,0 +1,216 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from mastodon_utils import RateLimited
+from metrics import POST_QUEUE_DEPTH, POST_QUEUE_SECONDS, POST_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class PostTask:
+    """One queued Mastodon call and its outcome."""
+
+    def __init__(self, method, function, args, kwargs, key, on_success, on_failure=None):
+        self.method = method
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.on_success = on_success
+        self.on_failure = on_failure
+        self.attempts = 0
+        self.queued_at = time.time()
+        self.run_at = self.queued_at
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class PostingPipeline:
+    """
+    Sends Mastodon calls from a queue on a pool of worker threads, so a slow
+    or rate-limited instance never holds up punt detection.
+
+    Calls with the same key, e.g. the punts of one game, run one at a time in
+    the order they were submitted; other calls run concurrently. A call's
+    on_success callback gets its result before the next call with its key
+    starts, so calls that need the status, like boosts and replies, are
+    scheduled from there. A failed call is retried with exponential backoff
+    up to `max_attempts` times, and a rate-limited one waits for the reset
+    without using up an attempt. Once a call is given up, its on_failure
+    callback gets the error.
+
+    Until start() is called, calls run in the submitting thread.
+    """
+
+    def __init__(self, max_workers=4, max_attempts=5, backoff=2, max_backoff=60):
+        """
+        Parameters:
+            max_workers: Calls sent at once.
+            max_attempts: Attempts before a failing call is given up.
+            backoff: Seconds before the first retry, doubled on every retry.
+            max_backoff: Longest wait between retries.
+        """
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.heap = []
+        self.counter = itertools.count()
+        # Key -> calls waiting for the one of that key in the heap or running
+        self.key_queues = {}
+        self.pending = 0
+        self.condition = threading.Condition()
+        self.executor = None
+        self.thread = None
+        self.running = False
+
+    def submit(self, method, function, *args, key=None, on_success=None, on_failure=None, **kwargs):
+        """
+        Queue a call.
+
+        Parameters:
+            method: Name of the call, for logs and metrics.
+            function: The account method to call with args and kwargs.
+            key: Calls with the same key run in submission order.
+            on_success: Called with the result once the call succeeds.
+            on_failure: Called with the error once the call is given up.
+
+        Returns:
+            PostTask: The queued call.
+        """
+        task = PostTask(method, function, args, kwargs, key, on_success, on_failure)
+        with self.condition:
+            running = self.running
+            if running:
+                self.pending += 1
+                POST_QUEUE_DEPTH.set(self.pending)
+                if key is None:
+                    self._push(task)
+                elif key in self.key_queues:
+                    self.key_queues[key].append(task)
+                else:
+                    self.key_queues[key] = deque()
+                    self._push(task)
+                self.condition.notify()
+        if not running:
+            self._run_inline(task)
+        return task
+
+    def pending_count(self):
+        with self.condition:
+            return self.pending
+
+    def start(self):
+        with self.condition:
+            self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='post')
+        self.thread = threading.Thread(target=self._dispatch, name='post-dispatcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=60):
+        """Send what's queued, waiting up to `timeout` seconds, then stop."""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.pending == 0, timeout):
+                logger.warning("Stopping with %d Mastodon calls unsent", self.pending)
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _push(self, task):
+        heapq.heappush(self.heap, (task.run_at, next(self.counter), task))
+
+    def _dispatch(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    if self.heap:
+                        wait_time = self.heap[0][0] - time.time()
+                        if wait_time <= 0:
+                            break
+                    else:
+                        wait_time = None
+                    self.condition.wait(wait_time)
+                if not self.running:
+                    return
+                _, _, task = heapq.heappop(self.heap)
+            self.executor.submit(self._execute, task)
+
+    def _attempt(self, task):
+        """
+        Make the call once.
+
+        Returns:
+            float: Seconds to wait before retrying, or None if the call is done.
+        """
+        try:
+            task.result = task.function(*task.args, **task.kwargs)
+        except RateLimited as error:
+            POST_RETRIES.labels(task.method).inc()
+            wait_time = max(error.reset_at - time.time(), 1.)
+            logger.warning("%s was rate limited (%s), retrying in %.0fs", task.method, error.__cause__ or error,
+                           wait_time)
+            return wait_time
+        except Exception as error:
+            task.attempts += 1
+            if task.attempts >= self.max_attempts:
+                logger.exception("%s failed %d times, giving up", task.method, task.attempts)
+                task.error = error
+                self._callback(task, task.on_failure, error)
+                return None
+            POST_RETRIES.labels(task.method).inc()
+            # Jittered, so calls that failed together don't all retry together
+            wait_time = min(self.backoff * 2 ** (task.attempts - 1), self.max_backoff) * random.uniform(0.8, 1.2)
+            logger.warning("%s failed (%s), retrying in %.1fs", task.method, error, wait_time)
+            return wait_time
+
+        POST_QUEUE_SECONDS.labels(task.method).observe(time.time() - task.queued_at)
+        # The call itself succeeded, so it isn't retried if the callback raises
+        self._callback(task, task.on_success, task.result)
+        return None
+
+    @staticmethod
+    def _callback(task, callback, argument):
+        if callback is None:
+            return
+        try:
+            callback(argument)
+        except Exception:
+            logger.exception("Callback of %s raised", task.method)
+
+    def _run_inline(self, task):
+        while True:
+            wait_time = self._attempt(task)
+            if wait_time is None:
+                break
+            time.sleep(wait_time)
+        task.done.set()
+
+    def _execute(self, task):
+        wait_time = self._attempt(task)
+        with self.condition:
+            if wait_time is not None:
+                task.run_at = time.time() + wait_time
+                self._push(task)
+            else:
+                self.pending -= 1
+                POST_QUEUE_DEPTH.set(self.pending)
+                if task.key is not None:
+                    waiting = self.key_queues[task.key]
+                    if waiting:
+                        self._push(waiting.popleft())
+                    else:
+                        del self.key_queues[task.key]
+                task.done.set()
+            self.condition.notify_all()
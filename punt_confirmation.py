@@ -0,0 +1,87 @@
+from collections import deque
+import statistics
+
+CONFIRMATION_STRATEGIES = ('stable', 'debounce')
+
+
+class PuntConfirmation:
+    """
+    Decides when a punt drive is safe to post.
+
+    With the `debounce` strategy a punt is only posted the second time it's
+    seen, so ESPN has a full polling cycle to correct the play. With the
+    `stable` strategy it's posted on first sight once the next drive has
+    started, and otherwise once its data is unchanged between two passes.
+    """
+
+    def __init__(self, strategy='stable', latency_window=1000):
+        """
+        Parameters:
+            strategy: One of CONFIRMATION_STRATEGIES.
+            latency_window: Number of recent detection-to-post latencies kept.
+        """
+        if strategy not in CONFIRMATION_STRATEGIES:
+            raise ValueError(f"Unknown confirmation strategy {strategy}")
+        self.strategy = strategy
+        self.latencies = deque(maxlen=latency_window)
+        # (game ID, drive ID) -> the punt's fields on the last pass that saw it
+        self.observations = {}
+
+    @staticmethod
+    def is_complete(play):
+        start = play.start
+        return None not in (start.team_id, start.possession_text, start.distance, play.clock_seconds,
+                            play.home_score, play.away_score)
+
+    @staticmethod
+    def get_fields(punt, drive):
+        start = punt.start
+        return (drive.fingerprint, punt.id, punt.text, punt.period, punt.clock_seconds, punt.home_score,
+                punt.away_score, start.team_id, start.possession_text, start.distance)
+
+    @staticmethod
+    def is_stable(punt, drive, game):
+        """
+        Whether a punt's data is unlikely to change: the next drive has
+        started and every field the Surrender Index needs is filled in.
+        """
+        if drive.result is None or not PuntConfirmation.is_complete(punt):
+            return False
+
+        previous_drives = game.previous_drives
+        if previous_drives and previous_drives[-1] is not drive:
+            return True
+        current_drive = game.summary.current_drive if game.summary else None
+        return bool(current_drive and current_drive.id != drive.id and current_drive.plays)
+
+    def should_post(self, punt, drive, game, first_seen):
+        """
+        Parameters:
+            punt: The punt play.
+            drive: The punt's drive.
+            game: The NFLGame the drive belongs to.
+            first_seen: Whether this is the first pass that saw the punt.
+
+        Returns:
+            bool: True if the punt should be posted now.
+        """
+        if self.strategy == 'debounce':
+            return not first_seen
+
+        key = (game.id, drive.id)
+        fields = self.get_fields(punt, drive)
+        previous_fields = self.observations.get(key)
+        if self.is_stable(punt, drive, game) or (not first_seen and previous_fields in (None, fields)):
+            # Punts seen before a restart have no earlier fields, and wait only one pass
+            self.observations.pop(key, None)
+            return True
+        # Changed since the last pass, so it waits for one more
+        self.observations[key] = fields
+        return False
+
+    def record_latency(self, seconds):
+        self.latencies.append(seconds)
+
+    @property
+    def median_latency(self):
+        return statistics.median(self.latencies) if self.latencies else None
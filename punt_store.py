@@ -0,0 +1,335 @@
+"""
+Columnar store of every scored punt with its game context.
+
+    # The 10 worst punts by Miami since 2010
+    python punt_store.py top --team MIA --seasons 2010 2024 -k 10
+
+    # Percentile of a Surrender Index among 4th quarter punts this decade
+    python punt_store.py percentile 25.3 --quarter 4 --seasons 2020 2029
+
+Historical punts are written by rebuild_historical.py as one structured
+NumPy array, memory-mapped read-only, plus a sort order for top-K lookups.
+The live bot appends the current season's punts to a separate segment of
+fixed-width records, which later rebuilds fold into the historical array.
+"""
+
+import argparse
+import json
+import os
+import threading
+import numpy as np
+
+PUNT_DTYPE = np.dtype([
+    ('surrender_index', '<f8'),
+    ('season', '<i2'),
+    ('week', '<i2'),
+    ('postseason', '?'),
+    ('team', 'S4'),
+    ('opponent', 'S4'),
+    ('game_id', 'S16'),
+    ('quarter', 'i1'),
+    ('clock_seconds', '<i2'),
+    ('yard_line', '<f4'),
+    ('opposing_territory', '?'),
+    ('distance', '<i2'),
+    ('score_diff', '<i2'),
+    ('situation', 'u1'),
+])
+
+FILTERS = ('season', 'week', 'postseason', 'team', 'opponent', 'game_id', 'quarter', 'situation')
+
+# Teams and weeks are stored as ESPN has them, like the bot's live punts.
+# nflfastR's abbreviations that differ are converted when historical punts
+# are rebuilt, and accepted in filters.
+NFLFASTR_TEAMS = {'LA': 'LAR', 'WAS': 'WSH', 'JAC': 'JAX'}
+
+
+def normalize_team(team):
+    return NFLFASTR_TEAMS.get(team, team)
+
+
+def normalize_nflfastr_punts(punts):
+    """
+    Convert punts scored from nflfastR play-by-play to ESPN's team
+    abbreviations and week numbers, in place.
+
+    nflfastR numbers postseason weeks on from the last regular season week,
+    while ESPN starts them again at 1, with the Super Bowl in week 5 after
+    the Pro Bowl.
+    """
+    for field in ('team', 'opponent'):
+        for nflfastr_team, espn_team in NFLFASTR_TEAMS.items():
+            punts[field][punts[field] == nflfastr_team.encode('utf-8')] = espn_team.encode('utf-8')
+    for season in np.unique(punts['season']):
+        in_season = punts['season'] == season
+        regular_weeks = punts['week'][in_season & ~punts['postseason']].max(initial=0)
+        postseason = in_season & punts['postseason']
+        week = punts['week'][postseason] - regular_weeks
+        punts['week'][postseason] = np.where(week >= 4, week + 1, week)
+    return punts
+
+
+class PuntStore:
+    """
+    Historical and current-season punts in one directory, with filtered
+    percentile and top-K queries.
+
+    Files:
+        historical.npy: Structured array of PUNT_DTYPE, ordered by season.
+        historical_order.npy: Row numbers of historical.npy from the highest
+            Surrender Index to the lowest.
+        meta.json: Count, season range and each season's rows.
+        live.bin: Appended PUNT_DTYPE records of the current season.
+    """
+
+    def __init__(self, directory='nfl_punts'):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._meta = None
+        self._historical = None
+        self._order = None
+        self._live = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def meta(self):
+        if self._meta is None:
+            if os.path.exists(self.path('meta.json')):
+                with open(self.path('meta.json')) as f:
+                    self._meta = json.load(f)
+            else:
+                self._meta = {'count': 0, 'first_season': None, 'last_season': None, 'seasons': {}}
+        return self._meta
+
+    def _open_historical(self):
+        if os.path.exists(self.path('historical.npy')):
+            self._historical = np.load(self.path('historical.npy'), mmap_mode='r')
+            self._order = np.load(self.path('historical_order.npy'), mmap_mode='r')
+        else:
+            self._historical = np.empty(0, dtype=PUNT_DTYPE)
+            self._order = np.empty(0, dtype=np.int64)
+
+    @property
+    def historical(self):
+        if self._historical is None:
+            self._open_historical()
+        return self._historical
+
+    @property
+    def historical_order(self):
+        if self._order is None:
+            self._open_historical()
+        return self._order
+
+    @property
+    def live(self):
+        with self.lock:
+            if self._live is None:
+                self._live = self.read_live()
+            return self._live
+
+    def read_live(self):
+        if not os.path.exists(self.path('live.bin')):
+            return np.empty(0, dtype=PUNT_DTYPE)
+        with open(self.path('live.bin'), 'rb') as f:
+            data = f.read()
+        # Ignore a record cut short by a crash mid-append
+        usable = len(data) - len(data) % PUNT_DTYPE.itemsize
+        return np.frombuffer(data[:usable], dtype=PUNT_DTYPE)
+
+    def __len__(self):
+        return len(self.historical) + len(self.live)
+
+    ### WRITING ###
+
+    @staticmethod
+    def make_record(**fields):
+        record = np.zeros(1, dtype=PUNT_DTYPE)
+        for name, value in fields.items():
+            record[name] = value.encode('utf-8') if isinstance(value, str) else value
+        return record
+
+    def append(self, **fields):
+        """Append one punt of the current season; see PUNT_DTYPE for the fields."""
+        record = self.make_record(**fields)
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # One small O_APPEND write, so records from several workers never interleave
+            with open(self.path('live.bin'), 'ab') as f:
+                f.write(record.tobytes())
+            if self._live is not None:
+                self._live = np.concatenate([self._live, record])
+
+    def build(self, punts, first_season=None, last_season=None):
+        """
+        Replace the historical punts, and drop live punts of the seasons they cover.
+
+        Parameters:
+            punts: Structured array of PUNT_DTYPE.
+            first_season: First season in the data.
+            last_season: Last season in the data.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        punts = np.asarray(punts, dtype=PUNT_DTYPE)
+        punts = punts[np.argsort(punts['season'], kind='stable')]
+        order = np.argsort(-punts['surrender_index'], kind='stable')
+        seasons = {}
+        for season in np.unique(punts['season']).tolist():
+            start, end = np.searchsorted(punts['season'], [season, season + 1])
+            seasons[str(season)] = [int(start), int(end)]
+
+        for name, array in (('historical.npy', punts), ('historical_order.npy', order)):
+            tmp_path = self.path(name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, self.path(name))
+
+        with self.lock:
+            live = self.read_live()
+            if last_season is not None and len(live):
+                live = live[live['season'] > last_season]
+                tmp_path = self.path('live.bin.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(live.tobytes())
+                os.replace(tmp_path, self.path('live.bin'))
+
+            meta = {'count': len(punts), 'first_season': first_season, 'last_season': last_season,
+                    'seasons': seasons}
+            tmp_path = self.path('meta.json.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path('meta.json'))
+            self._meta = self._historical = self._order = self._live = None
+
+    ### QUERIES ###
+
+    def historical_rows(self, season=None):
+        """
+        Returns:
+            tuple: (start, end) rows of the historical array that can hold the season filter.
+        """
+        count = len(self.historical)
+        if season is None or not self.meta['seasons']:
+            return 0, count
+        first, last = (season, season) if np.isscalar(season) else season
+        # Rows are ordered by season, so the matching seasons are contiguous
+        season_rows = [rows for season_str, rows in self.meta['seasons'].items() if first <= int(season_str) <= last]
+        if not season_rows:
+            return 0, 0
+        return min(rows[0] for rows in season_rows), max(rows[1] for rows in season_rows)
+
+    @staticmethod
+    def mask(punts, season=None, week=None, postseason=None, team=None, opponent=None, game_id=None,
+             quarter=None, situation=None):
+        """
+        Parameters:
+            punts: Structured array of PUNT_DTYPE.
+            season: A season, or an inclusive (first, last) range.
+            Other filters match their PUNT_DTYPE field exactly.
+
+        Returns:
+            np.ndarray: Whether each punt matches every given filter.
+        """
+        mask = np.ones(len(punts), dtype=bool)
+        if season is not None:
+            first, last = (season, season) if np.isscalar(season) else season
+            mask &= (punts['season'] >= first) & (punts['season'] <= last)
+        for name, value in (('week', week), ('postseason', postseason), ('team', team), ('opponent', opponent),
+                            ('game_id', game_id), ('quarter', quarter), ('situation', situation)):
+            if value is not None:
+                if name in ('team', 'opponent') and isinstance(value, str):
+                    value = normalize_team(value)
+                mask &= punts[name] == (value.encode('utf-8') if isinstance(value, str) else value)
+        return mask
+
+    def select(self, **filters):
+        """
+        Returns:
+            np.ndarray: Every matching punt, historical first, as PUNT_DTYPE records.
+        """
+        start, end = self.historical_rows(filters.get('season'))
+        historical = self.historical[start:end]
+        live = self.live
+        return np.concatenate([historical[self.mask(historical, **filters)], live[self.mask(live, **filters)]])
+
+    def count(self, **filters):
+        return len(self.select(**filters))
+
+    def percentile(self, surrender_index, **filters):
+        """
+        Percentile of a Surrender Index among the matching punts, matching
+        percentileofscore(..., kind='strict').
+
+        Returns:
+            float: The percentile, or NaN if no punt matches.
+        """
+        start, end = self.historical_rows(filters.get('season'))
+        historical = self.historical[start:end]
+        live = self.live
+        values = np.concatenate([historical['surrender_index'][self.mask(historical, **filters)],
+                                 live['surrender_index'][self.mask(live, **filters)]])
+        if not len(values):
+            return np.nan
+        return int(np.count_nonzero(values < surrender_index)) * (100.0 / len(values))
+
+    def top(self, k=10, lowest=False, **filters):
+        """
+        Returns:
+            np.ndarray: The k matching punts with the highest (or lowest) Surrender Index.
+        """
+        start, end = self.historical_rows(filters.get('season'))
+        historical_mask = np.zeros(len(self.historical), dtype=bool)
+        historical_mask[start:end] = self.mask(self.historical[start:end], **filters)
+        order = self.historical_order[::-1] if lowest else self.historical_order
+        # The sort order is shared by every query, so no matching punts are sorted here
+        rows = order[historical_mask[order]][:k]
+
+        live = self.live
+        candidates = np.concatenate([self.historical[rows], live[self.mask(live, **filters)]])
+        candidate_order = np.argsort(candidates['surrender_index'] if lowest else -candidates['surrender_index'],
+                                     kind='stable')
+        return candidates[candidate_order[:k]]
+
+
+def format_punt(punt):
+    return (f"{punt['surrender_index']:8.2f}  {punt['season']} week {punt['week']:<2}  "
+            f"{punt['team'].decode()} vs {punt['opponent'].decode():<4} Q{punt['quarter']}  "
+            f"{punt['distance']} to go, {'opp' if punt['opposing_territory'] else 'own'} {punt['yard_line']:.0f}, "
+            f"score {punt['score_diff']:+d}  {punt['game_id'].decode()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the per-punt Surrender Index store.")
+    parser.add_argument('--store', default='nfl_punts', dest='store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    top_parser = subparsers.add_parser('top', help="The highest (or lowest) Surrender Indices")
+    top_parser.add_argument('-k', type=int, default=10, dest='k')
+    top_parser.add_argument('--lowest', action='store_true', dest='lowest')
+    percentile_parser = subparsers.add_parser('percentile', help="Percentile of a Surrender Index")
+    percentile_parser.add_argument('surrender_index', type=float)
+    for subparser in (top_parser, percentile_parser):
+        subparser.add_argument('--seasons', type=int, nargs=2, dest='seasons')
+        subparser.add_argument('--season', type=int, dest='season')
+        subparser.add_argument('--week', type=int, dest='week')
+        subparser.add_argument('--team', dest='team')
+        subparser.add_argument('--opponent', dest='opponent')
+        subparser.add_argument('--quarter', type=int, dest='quarter')
+        subparser.add_argument('--postseason', action='store_true', default=None, dest='postseason')
+    args = parser.parse_args()
+
+    store = PuntStore(args.store)
+    filters = {name: getattr(args, name) for name in FILTERS if getattr(args, name, None) is not None}
+    if args.seasons:
+        filters['season'] = tuple(args.seasons)
+    if args.command == 'top':
+        for punt in store.top(args.k, args.lowest, **filters):
+            print(format_punt(punt))
+    else:
+        print(f"{store.percentile(args.surrender_index, **filters):.2f} percentile "
+              f"of {store.count(**filters)} punts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import math
+import os
+import struct
+import numpy as np
+
+MAGIC = b'TDIG'
+FORMAT_VERSION = 1
+# magic, format version, compression, total count, number of centroids
+HEADER = struct.Struct('<4sBdQI')
+
+
+class TDigest:
+    """
+    Merging t-digest: a mergeable quantile sketch with bounded memory.
+
+    Values are summarized as at most about `compression` centroids (mean,
+    weight, min and max), kept small in the tails, where the bot's
+    percentiles matter most, and larger around the median. Higher
+    compression means more centroids and a smaller error. Digests of
+    different seasons or processes merge into a digest of all their values.
+    """
+
+    def __init__(self, compression=100):
+        """
+        Parameters:
+            compression: Bound on the number of centroids, and so the accuracy.
+        """
+        self.compression = float(compression)
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.mins = np.empty(0, dtype=np.float64)
+        self.maxs = np.empty(0, dtype=np.float64)
+        self.buffer = []
+        self.buffer_size = int(10 * compression)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def centroid_count(self):
+        self.compress()
+        return len(self.means)
+
+    def add(self, value):
+        self.buffer.append(float(value))
+        self.count += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.compress()
+
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.compress()
+        self.count += len(values)
+        self._merge_centroids(values, np.ones(len(values)), values, values)
+
+    def merge(self, other):
+        """Merge another digest's values into this one."""
+        other.compress()
+        self.compress()
+        self.count += other.count
+        self._merge_centroids(other.means, other.weights, other.mins, other.maxs)
+        return self
+
+    def compress(self):
+        if self.buffer:
+            values = np.array(self.buffer, dtype=np.float64)
+            self.buffer = []
+            self._merge_centroids(values, np.ones(len(values)), values, values)
+
+    def _k(self, q):
+        # The k1 scale function, which keeps centroids small near q = 0 and q = 1
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q_limit(self, k):
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _merge_centroids(self, means, weights, mins, maxs):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        mins = np.concatenate([self.mins, mins])
+        maxs = np.concatenate([self.maxs, maxs])
+        if not len(means):
+            return
+        order = np.argsort(means, kind='stable')
+        means, weights, mins, maxs = means[order], weights[order], mins[order], maxs[order]
+
+        total = float(weights.sum())
+        merged_means, merged_weights, merged_mins, merged_maxs = [], [], [], []
+        weight_before = 0.
+        mean, weight, low, high = float(means[0]), float(weights[0]), float(mins[0]), float(maxs[0])
+        q_limit = self._q_limit(self._k(0.) + 1)
+        for next_mean, next_weight, next_low, next_high in zip(means[1:].tolist(), weights[1:].tolist(),
+                                                               mins[1:].tolist(), maxs[1:].tolist()):
+            if (weight_before + weight + next_weight) / total <= q_limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+                low = min(low, next_low)
+                high = max(high, next_high)
+            else:
+                merged_means.append(mean)
+                merged_weights.append(weight)
+                merged_mins.append(low)
+                merged_maxs.append(high)
+                weight_before += weight
+                q_limit = self._q_limit(self._k(min(weight_before / total, 1.)) + 1)
+                mean, weight, low, high = next_mean, next_weight, next_low, next_high
+        merged_means.append(mean)
+        merged_weights.append(weight)
+        merged_mins.append(low)
+        merged_maxs.append(high)
+
+        self.means = np.array(merged_means)
+        self.weights = np.array(merged_weights)
+        self.mins = np.array(merged_mins)
+        self.maxs = np.array(merged_maxs)
+
+    def count_below(self, value):
+        """
+        Estimate how many values are strictly less than `value`.
+
+        Each centroid's values are assumed to be spread linearly from its
+        min to its mean and from its mean to its max, half on each side.
+        Centroids of a single value are exact.
+        """
+        self.compress()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.where(
+                value <= self.mins, 0.,
+                np.where(value > self.maxs, 1.,
+                         np.where(value <= self.means,
+                                  0.5 * (value - self.mins) / (self.means - self.mins),
+                                  0.5 + 0.5 * (value - self.means) / (self.maxs - self.means))))
+        return float(np.dot(self.weights, fraction))
+
+    def to_bytes(self):
+        self.compress()
+        return HEADER.pack(MAGIC, FORMAT_VERSION, self.compression, self.count, len(self.means)) + \
+            np.concatenate([self.means, self.weights, self.mins, self.maxs]).astype('<f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, compression, count, size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a t-digest, or an unsupported version")
+        arrays = np.frombuffer(data, dtype='<f8', count=4 * size, offset=HEADER.size).astype(np.float64)
+        digest = cls(compression)
+        digest.means, digest.weights, digest.mins, digest.maxs = arrays.reshape(4, size)
+        digest.count = count
+        return digest
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    @classmethod
+    def from_values(cls, values, compression=100):
+        digest = cls(compression)
+        digest.add_many(values)
+        return digest
@@ -0,0 +1,293 @@
+"""
+rebuild_historical.py
+Rebuilds the historical surrender indices from the nflfastR play-by-play
+CSVs downloaded by pbp.R.
+
+Each season is scored into its own shard in parallel, and only seasons whose
+source CSV changed since the last run are rescored. The shards are then
+merged into the historical .npy and its sorted store. Every shard also gets a
+t-digest sketch, and the season sketches are merged into one for the bot's
+--percentiles sketch mode. Every punt is also kept with its game context in
+the per-punt store (punt_store.py), which the situational index behind
+--situationalContext is built from.
+
+Usage:
+    python rebuild_historical.py --data-dir pbp_data --workers 8
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import os
+import re
+import time
+import numpy as np
+from historical_store import HistoricalIndexStore
+from league import LEAGUES
+from punt_store import PUNT_DTYPE, PuntStore, normalize_nflfastr_punts
+from quantile_sketch import TDigest
+from situational_index import SituationalIndex, situation_keys
+from surrender_index import SurrenderIndex
+
+PBP_FILE_PATTERN = re.compile(r'play_by_play_(\d{4})\.csv$')
+COLUMNS = ['play_type', 'season_type', 'posteam', 'yrdln', 'ydstogo',
+           'posteam_score', 'defteam_score', 'qtr', 'game_seconds_remaining',
+           'game_id', 'week', 'defteam']
+
+
+def find_season_files(data_dir):
+    season_files = {}
+    for file_name in os.listdir(data_dir):
+        match = PBP_FILE_PATTERN.match(file_name)
+        if match:
+            season_files[int(match.group(1))] = os.path.join(data_dir, file_name)
+    return season_files
+
+
+def read_punt_rows(path):
+    """
+    Read only the columns needed for scoring, for punt plays only.
+
+    Lines that can't be a punt are skipped before they are parsed as CSV.
+
+    Returns:
+        dict: Column name -> list of string values.
+    """
+    with open(path, 'r', newline='') as f:
+        header = next(csv.reader(f), None)
+        if header is None:
+            return {column: [] for column in COLUMNS}
+        column_indices = [header.index(column) for column in COLUMNS]
+        play_type_index = header.index('play_type')
+        candidate_lines = [line for line in f if 'punt' in line]
+
+    columns = {column: [] for column in COLUMNS}
+    for row in csv.reader(candidate_lines):
+        if len(row) != len(header):
+            # A quoted field spans lines; parse this file the slow way
+            return read_punt_rows_full(path)
+        if row[play_type_index] != 'punt':
+            continue
+        for column, index in zip(COLUMNS, column_indices):
+            columns[column].append(row[index])
+    return columns
+
+
+def read_punt_rows_full(path):
+    columns = {column: [] for column in COLUMNS}
+    with open(path, 'r', newline='') as f:
+        for play in csv.DictReader(f):
+            if play['play_type'] != 'punt':
+                continue
+            for column in COLUMNS:
+                columns[column].append(play[column])
+    return columns
+
+
+def parse_yard_line(yrdln):
+    try:
+        if '50' in yrdln:
+            return 50.
+        return float(int(yrdln.split(' ')[-1]))
+    except ValueError:
+        return np.nan
+
+
+def score_season(season, path):
+    """
+    Calculate the surrender index of every punt in a season's play-by-play CSV.
+
+    Parameters:
+        season(int): The season of the play-by-play file.
+        path(str): Path to the play-by-play CSV.
+
+    Returns:
+        np.ndarray: Every punt as a PUNT_DTYPE record, in file order.
+    """
+    columns = read_punt_rows(path)
+    if not columns['play_type']:
+        return np.empty(0, dtype=PUNT_DTYPE)
+
+    quarter = np.array(columns['qtr'], dtype=np.int64)
+    game_seconds_remaining = np.array(columns['game_seconds_remaining'], dtype=np.float64).astype(np.int64)
+    # nflfastR counts down the game clock; convert regulation to seconds left in the quarter
+    clock_seconds = np.where(quarter <= 4, game_seconds_remaining - (15 * 60) * (4 - quarter),
+                             game_seconds_remaining)
+    # Overtime was 15 minutes before 2017 and still is in the postseason
+    postseason = np.array(columns['season_type']) == 'POST'
+    long_overtime = postseason | (season < 2017)
+
+    yard_line = [parse_yard_line(yrdln) for yrdln in columns['yrdln']]
+    in_opposing_territory = [posteam not in yrdln for posteam, yrdln in zip(columns['posteam'], columns['yrdln'])]
+    distance = np.array(columns['ydstogo'], dtype=np.int64)
+    score_diff = np.array(columns['posteam_score'], dtype=np.int64) - np.array(columns['defteam_score'], dtype=np.int64)
+    surrender_indices = SurrenderIndex.calc_surrender_indices(
+        yard_line,
+        in_opposing_territory,
+        distance,
+        score_diff,
+        quarter,
+        clock_seconds,
+        long_overtime)
+
+    punts = np.zeros(len(surrender_indices), dtype=PUNT_DTYPE)
+    punts['surrender_index'] = surrender_indices
+    punts['season'] = season
+    punts['week'] = np.array(columns['week'], dtype=np.int64)
+    punts['postseason'] = postseason
+    punts['team'] = columns['posteam']
+    punts['opponent'] = columns['defteam']
+    punts['game_id'] = columns['game_id']
+    punts['quarter'] = quarter
+    punts['clock_seconds'] = clock_seconds
+    punts['yard_line'] = yard_line
+    punts['opposing_territory'] = in_opposing_territory
+    punts['distance'] = distance
+    punts['score_diff'] = score_diff
+    punts['situation'] = situation_keys(distance, score_diff, in_opposing_territory, quarter)
+    return punts
+
+
+def sketch_path(shard_path):
+    return os.path.splitext(shard_path)[0] + '.tdigest'
+
+
+def punts_path(shard_path):
+    return os.path.splitext(shard_path)[0] + '_punts.npy'
+
+
+def save_array(path, array):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def build_shard(season, path, shard_path, compression=200):
+    punts = score_season(season, path)
+    surrender_indices = punts['surrender_index']
+    save_array(punts_path(shard_path), punts)
+    save_array(shard_path, surrender_indices)
+    TDigest.from_values(surrender_indices, compression).save(sketch_path(shard_path))
+    return season, len(surrender_indices)
+
+
+class HistoricalRebuild:
+
+    def __init__(self, data_dir='pbp_data', shard_dir='historical_shards', workers=None, sketch_compression=200,
+                 punt_store_dir='nfl_punts'):
+        self.data_dir = data_dir
+        self.shard_dir = shard_dir
+        self.workers = workers
+        self.sketch_compression = sketch_compression
+        self.punt_store_dir = punt_store_dir
+        self.manifest_path = os.path.join(shard_dir, 'manifest.json')
+
+    def shard_path(self, season):
+        return os.path.join(self.shard_dir, f'season_{season}.npy')
+
+    def load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def stale_seasons(self, season_files, manifest, force=False):
+        stale = []
+        for season, path in sorted(season_files.items()):
+            source_stat = os.stat(path)
+            entry = manifest.get(str(season), {})
+            if (force or not os.path.exists(self.shard_path(season))
+                    or not os.path.exists(sketch_path(self.shard_path(season)))
+                    or not os.path.exists(punts_path(self.shard_path(season)))
+                    or entry.get('sketch_compression') != self.sketch_compression
+                    or entry.get('size') != source_stat.st_size
+                    or entry.get('mtime_ns') != source_stat.st_mtime_ns):
+                stale.append(season)
+        return stale
+
+    def run(self, first_season=None, last_season=None, output_path=None, force=False):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        season_files = {season: path for season, path in find_season_files(self.data_dir).items()
+                        if (first_season is None or season >= first_season)
+                        and (last_season is None or season <= last_season)}
+        if not season_files:
+            raise ValueError(f"No play-by-play files found in {self.data_dir}")
+
+        manifest = self.load_manifest()
+        stale = self.stale_seasons(season_files, manifest, force)
+        print(f"Rescoring {len(stale)} of {len(season_files)} seasons")
+
+        start_time = time.time()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(build_shard, season, season_files[season], self.shard_path(season),
+                                       self.sketch_compression)
+                       for season in stale]
+            for future in futures:
+                season, count = future.result()
+                source_stat = os.stat(season_files[season])
+                manifest[str(season)] = {'size': source_stat.st_size,
+                                         'mtime_ns': source_stat.st_mtime_ns,
+                                         'count': count,
+                                         'sketch_compression': self.sketch_compression}
+                print(f"{season}: {count} punts")
+        self.write_manifest(manifest)
+
+        first, last = min(season_files), max(season_files)
+        # Named like the bot looks for it, so it reads the new seasons without any settings changing
+        output_path = output_path or LEAGUES['nfl'].historical_file_name(first, last)
+        surrender_indices = self.merge(sorted(season_files), output_path)
+        print(f"Wrote {len(surrender_indices)} punts to {output_path} in {time.time() - start_time:.1f}s")
+        return surrender_indices
+
+    def merge(self, seasons, output_path):
+        surrender_indices = np.concatenate(
+            [np.load(self.shard_path(season)) for season in seasons]).astype(np.float64)
+        save_array(output_path, surrender_indices)
+
+        store_path = os.path.splitext(output_path)[0] + '.sidx'
+        HistoricalIndexStore(store_path, output_path).build(
+            surrender_indices, first_season=seasons[0], last_season=seasons[-1])
+
+        # Season sketches merge without rescanning any punts
+        sketch = TDigest(self.sketch_compression)
+        for season in seasons:
+            sketch.merge(TDigest.load(sketch_path(self.shard_path(season))))
+        sketch.save(os.path.splitext(output_path)[0] + '.tdigest')
+
+        # Shards keep nflfastR's teams and weeks; the store has ESPN's, like the live punts
+        punts = normalize_nflfastr_punts(
+            np.concatenate([np.load(punts_path(self.shard_path(season))) for season in seasons]))
+        PuntStore(self.punt_store_dir).build(punts, first_season=seasons[0], last_season=seasons[-1])
+        SituationalIndex.build(os.path.splitext(output_path)[0] + '.sitx', punts['surrender_index'],
+                               punts['situation'], first_season=seasons[0], last_season=seasons[-1])
+        return surrender_indices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the historical surrender indices.")
+    parser.add_argument('--data-dir', default='pbp_data', dest='data_dir')
+    parser.add_argument('--shard-dir', default='historical_shards', dest='shard_dir')
+    parser.add_argument('--first-season', type=int, dest='first_season')
+    parser.add_argument('--last-season', type=int, dest='last_season')
+    parser.add_argument('--output', dest='output')
+    parser.add_argument('--workers', type=int, default=None, dest='workers')
+    parser.add_argument('--force', action='store_true', dest='force')
+    parser.add_argument('--sketch-compression', type=float, default=200, dest='sketch_compression')
+    parser.add_argument('--punt-store', default=LEAGUES['nfl'].punt_store_path, dest='punt_store')
+    args = parser.parse_args()
+
+    HistoricalRebuild(args.data_dir, args.shard_dir, args.workers, args.sketch_compression,
+                      args.punt_store).run(
+        args.first_season, args.last_season, args.output, args.force)
+
+
+if __name__ == "__main__":
+    main()
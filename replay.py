@@ -0,0 +1,336 @@
+"""
+Record and replay ESPN traffic, so the bot can be exercised offline.
+
+    # Record a live Sunday while the bot runs
+    python surrender_index_bot.py --record sunday.jsonl.gz
+
+    # Or build a synthetic slate
+    python replay.py synthesize --games 100 --output slate.jsonl.gz
+
+    # Serve it at 20x speed, and point the bot at the stand-in
+    python replay.py serve slate.jsonl.gz --speed 20 --port 8765
+    python surrender_index_bot.py --espnBaseUrl http://127.0.0.1:8765 --fakeMastodon posts.jsonl
+
+    # Summarize what the bot posted
+    python replay.py report posts.jsonl
+
+Archives are gzipped JSON lines, one recorded response per line.
+"""
+
+import argparse
+import bisect
+from collections import Counter
+from datetime import datetime, timezone
+from dateutil import parser as date_parser
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+ENDPOINTS = ('scoreboard', 'summary')
+# Archives recorded before multi-league support only hold NFL games
+DEFAULT_LEAGUE_PATH = 'football/nfl'
+
+
+def parse_url(url):
+    """
+    Returns:
+        tuple: (league path, e.g. football/nfl, endpoint, event ID or None).
+    """
+    parts = urlsplit(url)
+    segments = parts.path.rstrip('/').split('/')
+    league_path = '/'.join(segments[-3:-1]).lstrip('/')
+    event_id = parse_qs(parts.query).get('event', [None])[0]
+    return league_path, segments[-1], event_id
+
+
+class Recorder:
+    """Appends every scoreboard and summary response of a session to an archive."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+
+    def attach(self, session):
+        session.hooks['response'].append(self.record_response)
+
+    def record_response(self, response, *args, **kwargs):
+        league_path, endpoint, event_id = parse_url(response.url)
+        # 304s and errors carry no body worth replaying
+        if endpoint not in ENDPOINTS or response.status_code != 200:
+            return
+        self.write({'time': time.time(), 'league': league_path, 'endpoint': endpoint, 'event': event_id,
+                    'body': response.content.decode('utf-8')})
+
+    def write(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            # Sync flush, so everything recorded survives the bot being killed
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def load_archive(path):
+    """
+    Read a recorded archive, tolerating a truncated tail.
+
+    Returns:
+        list: The recorded entries, ordered by time.
+    """
+    entries = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    except EOFError:
+        # The recorder was killed before the archive was closed
+        pass
+    entries.sort(key=lambda entry: entry['time'])
+    return entries
+
+
+class ReplayArchive:
+    """
+    Serves recorded responses on a virtual clock.
+
+    Recorded time runs `speed` times faster than wall time, starting from the
+    first recorded response when the replay starts. Every request is answered
+    with the latest response recorded at or before the current replay time,
+    and scoreboard kickoff times are shifted onto the wall clock so the bot
+    considers the games active.
+    """
+
+    def __init__(self, entries, speed=1.0, wall_start=None):
+        if not entries:
+            raise ValueError("The archive is empty")
+        self.speed = speed
+        self.recorded_start = entries[0]['time']
+        self.recorded_end = entries[-1]['time']
+        self.wall_start = time.time() if wall_start is None else wall_start
+        self.scoreboards = {}
+        self.summaries = {}
+        for entry in entries:
+            if entry['endpoint'] == 'scoreboard':
+                times, bodies = self.scoreboards.setdefault(entry.get('league', DEFAULT_LEAGUE_PATH), ([], []))
+            else:
+                times, bodies = self.summaries.setdefault(entry['event'], ([], []))
+            times.append(entry['time'])
+            bodies.append(entry['body'].encode('utf-8'))
+        self.served = Counter()
+
+    def replay_time(self, now=None):
+        now = time.time() if now is None else now
+        return self.recorded_start + (now - self.wall_start) * self.speed
+
+    def to_wall_time(self, recorded_time):
+        return self.wall_start + (recorded_time - self.recorded_start) / self.speed
+
+    def is_finished(self, now=None):
+        return self.replay_time(now) > self.recorded_end
+
+    def latest(self, times, bodies, now=None):
+        if not times:
+            return None
+        index = bisect.bisect_right(times, self.replay_time(now)) - 1
+        # Before a game's first recorded response, serve that response
+        return bodies[max(index, 0)]
+
+    def shift_date(self, date_str):
+        recorded = date_parser.parse(date_str).replace(tzinfo=timezone.utc).timestamp()
+        shifted = datetime.fromtimestamp(self.to_wall_time(recorded), tz=timezone.utc)
+        return shifted.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def scoreboard(self, league_path=DEFAULT_LEAGUE_PATH, now=None):
+        body = self.latest(*self.scoreboards.get(league_path, ([], [])), now=now)
+        if body is None:
+            return None
+        scoreboard = json.loads(body)
+        for event in scoreboard.get('events', []):
+            if event.get('date'):
+                event['date'] = self.shift_date(event['date'])
+        self.served['scoreboard'] += 1
+        return json.dumps(scoreboard).encode('utf-8')
+
+    def summary(self, event_id, now=None):
+        if event_id not in self.summaries:
+            return None
+        self.served['summary'] += 1
+        return self.latest(*self.summaries[event_id], now=now)
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        league_path, endpoint, event_id = parse_url(self.path)
+        if endpoint == 'scoreboard':
+            body = self.server.archive.scoreboard(league_path)
+        elif endpoint == 'summary':
+            body = self.server.archive.summary(event_id)
+        else:
+            body = None
+        if body is None:
+            self.send_error(404)
+            return
+
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """A local HTTP stand-in for the ESPN API, serving a ReplayArchive."""
+
+    def __init__(self, archive, host='127.0.0.1', port=0):
+        self.archive = archive
+        self.httpd = ThreadingHTTPServer((host, port), ReplayRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.archive = archive
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='replay-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def synthesize_slate(path, games=100, drives=24, drive_seconds=450, kickoff_spread=0,
+                     filler_kb=20, start_time=None):
+    """
+    Write a synthetic archive of simultaneous games, where every drive ends in a punt.
+
+    Parameters:
+        path: Archive to write.
+        games: Number of games.
+        drives: Drives per game.
+        drive_seconds: Recorded seconds between one drive and the next.
+        kickoff_spread: Seconds over which kickoffs are spread.
+        filler_kb: Size of the unused sections of each summary.
+        start_time: Recorded time of the first kickoff.
+    """
+    from benchmarks.synthetic import make_scoreboard, make_summary
+
+    start_time = time.time() if start_time is None else start_time
+    game_ids = [str(401700000 + game) for game in range(games)]
+    kickoffs = [start_time + (kickoff_spread * game / games if games else 0) for game in range(games)]
+    dates = [datetime.fromtimestamp(kickoff, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+             for kickoff in kickoffs]
+
+    entries = [{'time': start_time - 1, 'league': DEFAULT_LEAGUE_PATH, 'endpoint': 'scoreboard', 'event': None,
+                'body': json.dumps(make_scoreboard(game_ids, dates))}]
+    for game, (game_id, kickoff) in enumerate(zip(game_ids, kickoffs)):
+        for drive in range(drives + 1):
+            status = 'STATUS_FINAL' if drive == drives else 'STATUS_IN_PROGRESS'
+            summary = make_summary(game_id, drives=drive, status=status, filler_kb=filler_kb, seed=game)
+            entries.append({'time': kickoff + drive * drive_seconds, 'league': DEFAULT_LEAGUE_PATH, 'endpoint': 'summary',
+                            'event': game_id, 'body': json.dumps(summary, separators=(',', ':'))})
+
+    entries.sort(key=lambda entry: entry['time'])
+    with gzip.open(path, 'wt', encoding='utf-8') as archive:
+        for entry in entries:
+            archive.write(json.dumps(entry) + '\n')
+    return len(entries)
+
+
+def load_events(path):
+    with open(path) as log_file:
+        return [json.loads(line) for line in log_file if line.strip()]
+
+
+def report(events):
+    """
+    Summarize the events recorded by FakeMastodonBot.
+
+    Returns:
+        dict: Event counts, posting rate and duplicated posts.
+    """
+    counts = Counter(f"{event['account']}.{event['action']}" for event in events)
+    posts = [event for event in events if event['action'] == 'post' and not event.get('reply_id')]
+    texts = Counter(event['text'] for event in posts)
+    times = [event['time'] for event in events]
+    duration = max(times) - min(times) if times else 0
+    return {'counts': dict(sorted(counts.items())),
+            'posts': len(posts),
+            'duration_seconds': duration,
+            'posts_per_minute': len(posts) / duration * 60 if duration else None,
+            'duplicate_posts': sum(count - 1 for count in texts.values() if count > 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay ESPN traffic for the Surrender Index bot.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="Serve an archive as a local ESPN stand-in")
+    serve_parser.add_argument('archive')
+    serve_parser.add_argument('--speed', type=float, default=1.0, dest='speed')
+    serve_parser.add_argument('--host', default='127.0.0.1', dest='host')
+    serve_parser.add_argument('--port', type=int, default=8765, dest='port')
+
+    synthesize_parser = subparsers.add_parser('synthesize', help="Write a synthetic slate")
+    synthesize_parser.add_argument('--output', required=True, dest='output')
+    synthesize_parser.add_argument('--games', type=int, default=100, dest='games')
+    synthesize_parser.add_argument('--drives', type=int, default=24, dest='drives')
+    synthesize_parser.add_argument('--driveSeconds', type=float, default=450, dest='driveSeconds')
+    synthesize_parser.add_argument('--kickoffSpread', type=float, default=0, dest='kickoffSpread')
+    synthesize_parser.add_argument('--fillerKb', type=int, default=20, dest='fillerKb')
+
+    report_parser = subparsers.add_parser('report', help="Summarize a fake Mastodon log")
+    report_parser.add_argument('log')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        archive = ReplayArchive(load_archive(args.archive), speed=args.speed)
+        server = ReplayServer(archive, args.host, args.port).start()
+        print(f"Serving {args.archive} at {server.base_url} ({args.speed}x)")
+        try:
+            while not archive.is_finished():
+                time.sleep(1)
+            print("Replay finished, still serving the final responses. Press Ctrl-C to stop.")
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            print(f"Served {dict(archive.served)}")
+    elif args.command == 'synthesize':
+        count = synthesize_slate(args.output, args.games, args.drives, args.driveSeconds,
+                                 args.kickoffSpread, args.fillerKb)
+        print(f"Wrote {count} responses to {args.output}")
+    elif args.command == 'report':
+        print(json.dumps(report(load_events(args.log)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from datetime import timezone
+import json
+import logging
+import time
+from dateutil import parser
+
+logger = logging.getLogger(__name__)
+
+# Games in these states won't kick off again
+DONE_STATUSES = {'STATUS_FINAL', 'STATUS_POSTPONED', 'STATUS_CANCELED'}
+
+
+def get_kickoff(event):
+    return parser.parse(event['date']).replace(tzinfo=timezone.utc).timestamp()
+
+
+def get_status(event):
+    return event.get('status', {}).get('type', {}).get('name')
+
+
+class ScheduleCache:
+    """
+    The week's games of every league, from the ESPN scoreboard.
+
+    The events are kept in the state store, so a restart doesn't need the
+    scoreboard, and refreshed every `refresh_interval` seconds with a
+    conditional request, which is one round trip and no decoding when
+    nothing changed. Only new, changed and removed games are written back.
+    Between games, the bot sleeps until `lead_time` before the next kickoff
+    or until the next refresh, whichever comes first, so flexed and delayed
+    games are picked up without polling.
+    """
+
+    def __init__(self, store, refresh_interval=60 * 60, lead_time=15 * 60):
+        """
+        Parameters:
+            store: StateStore the schedule is kept in.
+            refresh_interval: Seconds between scoreboard requests.
+            lead_time: Seconds before a kickoff that its game becomes active.
+        """
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self.lead_time = lead_time
+        # League key -> game ID -> event info, as JSON and decoded
+        self.event_json = {}
+        self.events = {}
+        # League key -> (url, etag, last modified, refreshed at)
+        self.refreshes = {}
+
+    def load(self, league_key):
+        if league_key not in self.events:
+            event_json, refresh = self.store.load_schedule(league_key)
+            self.event_json[league_key] = event_json
+            self.events[league_key] = {game_id: json.loads(event) for game_id, event in event_json.items()}
+            if refresh is not None:
+                self.refreshes[league_key] = refresh
+        return self.events[league_key]
+
+    def get_events(self, league_key):
+        """
+        Returns:
+            list: ESPN event info of the league's games, by kickoff.
+        """
+        return sorted(self.load(league_key).values(), key=lambda event: event.get('date', ''))
+
+    @staticmethod
+    def scoreboard_url(league, api_root):
+        return f"{league.base_url(api_root)}/scoreboard"
+
+    def refresh_due(self, league, api_root, now=None):
+        now = time.time() if now is None else now
+        self.load(league.key)
+        refresh = self.refreshes.get(league.key)
+        # A cache filled from another ESPN root, e.g. a replay, is never reused
+        return refresh is None or refresh[0] != self.scoreboard_url(league, api_root) or \
+            now - refresh[3] >= self.refresh_interval
+
+    def refresh(self, session, league, api_root):
+        """
+        Fetch the league's scoreboard, conditionally when it was fetched before.
+
+        Returns:
+            bool: True if any game was added, changed or removed.
+        """
+        url = self.scoreboard_url(league, api_root)
+        self.load(league.key)
+        old_json = self.event_json[league.key]
+        old_events = self.events[league.key]
+        refresh = self.refreshes.get(league.key)
+
+        headers = {}
+        if refresh is not None and refresh[0] == url:
+            if refresh[1]:
+                headers['If-None-Match'] = refresh[1]
+            if refresh[2]:
+                headers['If-Modified-Since'] = refresh[2]
+        response = session.get(url, params=league.scoreboard_params, headers=headers, timeout=10)
+        if response.status_code == 304:
+            self.store.touch_schedule(league.key)
+            self.refreshes[league.key] = (url, refresh[1], refresh[2], time.time())
+            return False
+        response.raise_for_status()
+
+        new_json = {}
+        changed_events = []
+        for event in response.json()['events']:
+            event_json = json.dumps(event, sort_keys=True)
+            new_json[event['id']] = event_json
+            if old_json.get(event['id']) != event_json:
+                changed_events.append((event['id'], get_kickoff(event), get_status(event), event_json))
+        removed_game_ids = [game_id for game_id in old_json if game_id not in new_json]
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        self.store.save_schedule(league.key, url, changed_events, removed_game_ids, etag, last_modified)
+
+        for game_id, _, _, event_json in changed_events:
+            event = json.loads(event_json)
+            if game_id in old_events and old_events[game_id].get('date') != event.get('date'):
+                logger.info("Game %s moved from %s to %s", game_id, old_events[game_id].get('date'),
+                            event.get('date'))
+        self.event_json[league.key] = new_json
+        self.events[league.key] = {game_id: json.loads(event_json) for game_id, event_json in new_json.items()}
+        self.refreshes[league.key] = (url, etag, last_modified, time.time())
+        if changed_events or removed_game_ids:
+            logger.info("Schedule of %s: %d games, %d new or changed, %d removed", league.name,
+                        len(new_json), len(changed_events), len(removed_game_ids))
+        return bool(changed_events or removed_game_ids)
+
+    def next_kickoff(self, league_keys, now=None):
+        """
+        Returns:
+            float: Epoch time of the next kickoff more than `lead_time` away, or None.
+        """
+        now = time.time() if now is None else now
+        kickoffs = [get_kickoff(event) for league_key in league_keys for event in self.load(league_key).values()
+                    if get_status(event) not in DONE_STATUSES]
+        upcoming = [kickoff for kickoff in kickoffs if kickoff - self.lead_time > now]
+        return min(upcoming) if upcoming else None
+
+    def next_wake_time(self, league_keys, now=None):
+        """
+        Returns:
+            float: Epoch time of the next kickoff's lead time or the next
+                refresh, whichever comes first.
+        """
+        now = time.time() if now is None else now
+        wake_times = [refresh[3] + self.refresh_interval for league_key, refresh in self.refreshes.items()
+                      if league_key in league_keys]
+        next_kickoff = self.next_kickoff(league_keys, now)
+        if next_kickoff is not None:
+            wake_times.append(next_kickoff - self.lead_time)
+        return max(min(wake_times), now) if wake_times else now + self.refresh_interval
@@ -0,0 +1,155 @@
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b'SITXSORT'
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+# Buckets of the Surrender Index factors, in the order of their multipliers
+YARDS_TO_GO_LABELS = ['10+ to go', '7-9 to go', '4-6 to go', '2-3 to go', '1 to go']
+SCORE_LABELS = ['leading', 'tied', 'trailing by 9+', 'trailing by 1-8']
+TERRITORY_LABELS = ['own territory', 'opposing territory']
+QUARTER_LABELS = ['1st quarter', '2nd quarter', '3rd quarter', '4th quarter', 'overtime']
+SITUATION_COUNT = len(YARDS_TO_GO_LABELS) * len(SCORE_LABELS) * len(TERRITORY_LABELS) * len(QUARTER_LABELS)
+
+
+def situation_keys(distance, score_diff, in_opposing_territory, quarter):
+    """
+    Bucket punts by yards to go, score, territory and quarter.
+
+    Parameters:
+        distance: Yards to go for a first down.
+        score_diff: Score differential of the punting team.
+        in_opposing_territory: True if the punting team is in opposing territory.
+        quarter: Quarter number (5+ for overtime).
+
+    Returns:
+        np.ndarray: A key below SITUATION_COUNT for every punt.
+    """
+    distance = np.asarray(distance)
+    score_diff = np.asarray(score_diff)
+    yards_to_go = np.select([distance >= 10, distance >= 7, distance >= 4, distance >= 2], [0, 1, 2, 3], 4)
+    score = np.select([score_diff > 0, score_diff == 0, score_diff < -8], [0, 1, 2], 3)
+    territory = np.asarray(in_opposing_territory, dtype=np.int64)
+    quarter = np.clip(np.asarray(quarter), 1, len(QUARTER_LABELS)) - 1
+    return ((yards_to_go * len(SCORE_LABELS) + score) * len(TERRITORY_LABELS) + territory) \
+        * len(QUARTER_LABELS) + quarter
+
+
+def describe_situation(key):
+    key, quarter = divmod(int(key), len(QUARTER_LABELS))
+    key, territory = divmod(key, len(TERRITORY_LABELS))
+    yards_to_go, score = divmod(key, len(SCORE_LABELS))
+    return ', '.join([YARDS_TO_GO_LABELS[yards_to_go], TERRITORY_LABELS[territory],
+                      SCORE_LABELS[score], QUARTER_LABELS[quarter]])
+
+
+class SituationalIndex:
+    """
+    Historical surrender indices grouped by situation, for percentiles among
+    punts in the same situation.
+
+    The file holds a JSON header (season range and where each situation's
+    indices start) followed by every index as little-endian float64, sorted
+    by situation and then by value. Like HistoricalIndexStore it's opened
+    read-only with mmap, and a lookup is one binary search in one situation.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._header = None
+        self._indices = None
+        self._offsets = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._open()
+        return self._header
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) != PREAMBLE.size:
+                raise ValueError(f"{self.path} is too short to be a situational index")
+            magic, version, header_length = PREAMBLE.unpack(preamble)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{self.path} is not a supported situational index")
+            header = json.loads(f.read(header_length))
+        self._offsets = header['offsets']
+        if header['count'] == 0:
+            self._indices = np.array([], dtype='<f8')
+        else:
+            self._indices = np.memmap(self.path, dtype='<f8', mode='r',
+                                      offset=PREAMBLE.size + header_length, shape=(header['count'],))
+        self._header = header
+
+    def situation(self, key):
+        """
+        Returns:
+            np.ndarray: The sorted historical indices of a situation.
+        """
+        if self._header is None:
+            self._open()
+        return self._indices[self._offsets[key]:self._offsets[key + 1]]
+
+    def count(self, key):
+        if self._header is None:
+            self._open()
+        return self._offsets[key + 1] - self._offsets[key]
+
+    def percentile(self, surrender_index, key):
+        """
+        Percentile of a punt among historical punts in the same situation,
+        matching percentileofscore(..., kind='strict').
+
+        Returns:
+            float: The percentile, or NaN if no punt was in that situation.
+        """
+        indices = self.situation(key)
+        if not len(indices):
+            return np.nan
+        return int(np.searchsorted(indices, surrender_index, side='left')) * (100.0 / len(indices))
+
+    @classmethod
+    def build(cls, path, surrender_indices, keys, first_season=None, last_season=None):
+        """
+        Write the index.
+
+        Parameters:
+            path: File to write.
+            surrender_indices: Array of historical surrender indices.
+            keys: Situation key of every index, from situation_keys.
+            first_season: First season in the data.
+            last_season: Last season in the data.
+        """
+        surrender_indices = np.asarray(surrender_indices, dtype='<f8')
+        keys = np.asarray(keys, dtype=np.int64)
+        order = np.lexsort((surrender_indices, keys))
+        data = surrender_indices[order].tobytes()
+        offsets = np.searchsorted(keys[order], np.arange(SITUATION_COUNT + 1), side='left')
+        header = {
+            'count': int(surrender_indices.size),
+            'first_season': first_season,
+            'last_season': last_season,
+            'offsets': [int(offset) for offset in offsets],
+        }
+        header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+        header_bytes += b' ' * (-(PREAMBLE.size + len(header_bytes)) % ALIGNMENT)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return cls(path)
@@ -0,0 +1,395 @@
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posted_drives (
+    game_id TEXT NOT NULL,
+    drive_id TEXT NOT NULL,
+    posted_at REAL NOT NULL,
+    PRIMARY KEY (game_id, drive_id)
+);
+CREATE TABLE IF NOT EXISTS seen_drives (
+    game_id TEXT NOT NULL,
+    drive_id TEXT NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (game_id, drive_id)
+);
+CREATE TABLE IF NOT EXISTS finished_games (
+    game_id TEXT PRIMARY KEY,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS status_ids (
+    game_id TEXT NOT NULL,
+    drive_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    status_id TEXT NOT NULL,
+    PRIMARY KEY (game_id, drive_id, account)
+);
+CREATE TABLE IF NOT EXISTS current_indices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    surrender_index REAL NOT NULL,
+    recorded_at REAL NOT NULL,
+    league TEXT NOT NULL DEFAULT 'nfl'
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    run_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_run_at ON jobs (run_at);
+CREATE TABLE IF NOT EXISTS published_games (
+    game_id TEXT PRIMARY KEY,
+    league TEXT NOT NULL,
+    event_info TEXT NOT NULL,
+    published_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS game_leases (
+    game_id TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS drive_claims (
+    game_id TEXT NOT NULL,
+    drive_id TEXT NOT NULL,
+    worker_id TEXT NOT NULL,
+    claimed_at REAL NOT NULL,
+    PRIMARY KEY (game_id, drive_id)
+);
+CREATE TABLE IF NOT EXISTS schedule (
+    game_id TEXT PRIMARY KEY,
+    league TEXT NOT NULL,
+    kickoff REAL NOT NULL,
+    status TEXT,
+    event_info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS schedule_refreshes (
+    league TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+
+class StateStore:
+    """
+    Transactional bot state in one WAL-mode SQLite database.
+
+    Holds posted and seen drives, finished games, posted status IDs, the
+    current season's surrender indices, pending delayed jobs and the cached
+    schedule. Every write
+    is its own transaction, so a crash never leaves partial state behind and
+    a restarted bot picks up exactly where it stopped.
+
+    In sharded mode it's also shared by the coordinator and every worker,
+    and holds the published games, game leases and drive claims.
+    """
+
+    def __init__(self, path='surrender_index_state.db'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=FULL')
+        # Sharded workers write to the same database, so wait out each other's transactions
+        self.connection.execute('PRAGMA busy_timeout=10000')
+        self.connection.executescript(SCHEMA)
+        self.migrate()
+
+    def migrate(self):
+        # Databases from before multi-league support only held NFL indices
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(current_indices)')]
+        if 'league' not in columns:
+            self.connection.execute("ALTER TABLE current_indices ADD COLUMN league TEXT NOT NULL DEFAULT 'nfl'")
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def execute(self, sql, parameters=()):
+        # Single statements are atomic on their own in autocommit mode
+        with self.lock:
+            return self.connection.execute(sql, parameters)
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    ### DRIVES ###
+
+    def mark_posted(self, game_id, drive_id):
+        self.execute('INSERT OR IGNORE INTO posted_drives VALUES (?, ?, ?)',
+                     (game_id, drive_id, time.time()))
+
+    def is_posted(self, game_id, drive_id):
+        return bool(self.query('SELECT 1 FROM posted_drives WHERE game_id = ? AND drive_id = ?',
+                               (game_id, drive_id)))
+
+    def load_posted(self):
+        return self._group_drives('SELECT game_id, drive_id FROM posted_drives')
+
+    def mark_seen(self, game_id, drive_id):
+        self.execute('INSERT OR IGNORE INTO seen_drives VALUES (?, ?, ?)',
+                     (game_id, drive_id, time.time()))
+
+    def load_seen(self):
+        return self._group_drives('SELECT game_id, drive_id FROM seen_drives')
+
+    def _group_drives(self, sql):
+        drives = {}
+        for game_id, drive_id in self.query(sql):
+            drives.setdefault(game_id, set()).add(drive_id)
+        return drives
+
+    ### GAMES ###
+
+    def mark_final_seen(self, game_id):
+        self.execute('INSERT OR IGNORE INTO finished_games VALUES (?, 0, ?)', (game_id, time.time()))
+
+    def mark_completed(self, game_id):
+        self.execute('INSERT INTO finished_games VALUES (?, 1, ?) '
+                     'ON CONFLICT (game_id) DO UPDATE SET completed = 1, updated_at = excluded.updated_at',
+                     (game_id, time.time()))
+
+    def load_finished(self):
+        """
+        Returns:
+            tuple: (IDs of games seen final at least once, IDs of completed games).
+        """
+        final_games, completed_games = set(), set()
+        for game_id, completed in self.query('SELECT game_id, completed FROM finished_games'):
+            final_games.add(game_id)
+            if completed:
+                completed_games.add(game_id)
+        return final_games, completed_games
+
+    ### STATUSES ###
+
+    def save_status_id(self, game_id, drive_id, account, status_id):
+        self.execute('INSERT OR REPLACE INTO status_ids VALUES (?, ?, ?, ?)',
+                     (game_id, drive_id, account, str(status_id)))
+
+    def get_status_id(self, game_id, drive_id, account):
+        rows = self.query('SELECT status_id FROM status_ids WHERE game_id = ? AND drive_id = ? AND account = ?',
+                          (game_id, drive_id, account))
+        return rows[0][0] if rows else None
+
+    ### CURRENT SEASON ###
+
+    def add_current_index(self, surrender_index, league='nfl'):
+        """
+        Returns:
+            int: The row ID of the index.
+        """
+        return self.execute('INSERT INTO current_indices (surrender_index, recorded_at, league) VALUES (?, ?, ?)',
+                     (float(surrender_index), time.time(), league)).lastrowid
+
+    def add_current_indices(self, surrender_indices, league='nfl'):
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                'INSERT INTO current_indices (surrender_index, recorded_at, league) VALUES (?, ?, ?)',
+                [(float(surrender_index), now, league) for surrender_index in surrender_indices])
+
+    def load_current_indices(self, league='nfl'):
+        rows = self.query('SELECT surrender_index FROM current_indices WHERE league = ?', (league,))
+        return np.array([row[0] for row in rows], dtype=np.float64)
+
+    def load_current_indices_after(self, league='nfl', after_id=0):
+        """
+        Returns:
+            list: (row ID, surrender index) of every index recorded after `after_id`, in order.
+        """
+        return self.query('SELECT id, surrender_index FROM current_indices WHERE league = ? AND id > ? ORDER BY id',
+                          (league, after_id))
+
+    def count_current_indices(self, league='nfl'):
+        return self.query('SELECT COUNT(*) FROM current_indices WHERE league = ?', (league,))[0][0]
+
+    ### JOBS ###
+
+    def save_job(self, job):
+        self.execute('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)',
+                     (job['id'], job['kind'], json.dumps(job['payload']), job['run_at'], job['attempts']))
+
+    def delete_job(self, job_id):
+        self.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def load_jobs(self):
+        return [{'id': job_id, 'kind': kind, 'payload': json.loads(payload),
+                 'run_at': run_at, 'attempts': attempts}
+                for job_id, kind, payload, run_at, attempts
+                in self.query('SELECT id, kind, payload, run_at, attempts FROM jobs ORDER BY run_at')]
+
+    ### SCHEDULE ###
+
+    def save_schedule(self, league, url, events, removed_game_ids, etag=None, last_modified=None):
+        """
+        Parameters:
+            league: League key.
+            url: Scoreboard the events came from.
+            events: (game ID, kickoff, status, event info JSON) of new or changed games.
+            removed_game_ids: IDs of games no longer on the scoreboard.
+            etag: ETag of the scoreboard response.
+            last_modified: Last-Modified of the scoreboard response.
+        """
+        with self.transaction() as connection:
+            connection.executemany('DELETE FROM schedule WHERE game_id = ?',
+                                   [(game_id,) for game_id in removed_game_ids])
+            connection.executemany('INSERT OR REPLACE INTO schedule VALUES (?, ?, ?, ?, ?)',
+                                   [(game_id, league, kickoff, status, event_info)
+                                    for game_id, kickoff, status, event_info in events])
+            connection.execute('INSERT OR REPLACE INTO schedule_refreshes VALUES (?, ?, ?, ?, ?)',
+                               (league, url, etag, last_modified, time.time()))
+
+    def touch_schedule(self, league):
+        self.execute('UPDATE schedule_refreshes SET refreshed_at = ? WHERE league = ?', (time.time(), league))
+
+    def load_schedule(self, league):
+        """
+        Returns:
+            tuple: (game ID -> event info JSON, (url, etag, last modified, refreshed at) or None).
+        """
+        events = dict(self.query('SELECT game_id, event_info FROM schedule WHERE league = ?', (league,)))
+        refreshes = self.query('SELECT url, etag, last_modified, refreshed_at FROM schedule_refreshes '
+                               'WHERE league = ?', (league,))
+        return events, refreshes[0] if refreshes else None
+
+    ### SHARDING ###
+
+    def publish_games(self, games):
+        """
+        Parameters:
+            games: (game ID, league key, ESPN event info) of every game this week.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany('INSERT OR REPLACE INTO published_games VALUES (?, ?, ?, ?)',
+                                   [(game_id, league, json.dumps(event_info), now)
+                                    for game_id, league, event_info in games])
+
+    def load_published_games(self):
+        return [(game_id, league, json.loads(event_info)) for game_id, league, event_info
+                in self.query('SELECT game_id, league, event_info FROM published_games')]
+
+    def acquire_leases(self, worker_id, game_ids, ttl):
+        """
+        Renew this worker's leases and take free ones, up to a fair share.
+
+        A worker's fair share is the number of active games divided by the
+        number of workers with a recent heartbeat. Leases beyond the share are
+        released, so games spread out again when a worker joins, and leases
+        that weren't renewed within `ttl` are free to take.
+
+        Parameters:
+            worker_id: The worker acquiring leases.
+            game_ids: IDs of every active game.
+            ttl: Seconds a lease or heartbeat stays valid.
+
+        Returns:
+            set: IDs of the games leased to this worker.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO workers VALUES (?, ?)', (worker_id, now))
+            live_workers = connection.execute('SELECT COUNT(*) FROM workers WHERE heartbeat_at > ?',
+                                              (now - ttl,)).fetchone()[0]
+            share = -(-len(game_ids) // max(live_workers, 1))
+
+            owners = dict(connection.execute('SELECT game_id, worker_id FROM game_leases WHERE expires_at > ?',
+                                             (now,)))
+            game_ids = sorted(game_ids)
+            held = [game_id for game_id in game_ids if owners.get(game_id) == worker_id][:share]
+            free = [game_id for game_id in game_ids if game_id not in owners]
+            held += free[:share - len(held)]
+
+            connection.execute('DELETE FROM game_leases WHERE worker_id = ?', (worker_id,))
+            connection.executemany('INSERT OR REPLACE INTO game_leases VALUES (?, ?, ?)',
+                                   [(game_id, worker_id, now + ttl) for game_id in held])
+        return set(held)
+
+    def release_leases(self, worker_id):
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM game_leases WHERE worker_id = ?', (worker_id,))
+            connection.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,))
+
+    def load_leases(self):
+        """
+        Returns:
+            dict: Worker ID -> number of unexpired game leases.
+        """
+        return dict(self.query('SELECT worker_id, COUNT(*) FROM game_leases WHERE expires_at > ? GROUP BY worker_id',
+                               (time.time(),)))
+
+    def claim_drive(self, game_id, drive_id, worker_id, timeout):
+        """
+        Atomically claim the right to post a drive.
+
+        A drive is claimed by at most one worker at a time, and never once
+        it's posted. A claim that wasn't followed by a post within `timeout`
+        seconds, e.g. because its worker died, can be taken over.
+
+        Returns:
+            bool: True if this worker may post the drive.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            if connection.execute('SELECT 1 FROM posted_drives WHERE game_id = ? AND drive_id = ?',
+                                  (game_id, drive_id)).fetchone():
+                return False
+            claim = connection.execute('SELECT worker_id, claimed_at FROM drive_claims '
+                                       'WHERE game_id = ? AND drive_id = ?', (game_id, drive_id)).fetchone()
+            if claim and claim[0] != worker_id and claim[1] > now - timeout:
+                return False
+            connection.execute('INSERT OR REPLACE INTO drive_claims VALUES (?, ?, ?, ?)',
+                               (game_id, drive_id, worker_id, now))
+            return True
+
+    def renew_drive_claims(self, worker_id, claims):
+        """
+        Keep a worker's claims from expiring while their posts are pending.
+
+        Parameters:
+            worker_id: The worker holding the claims.
+            claims: (game ID, drive ID) of each claimed drive.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany('UPDATE drive_claims SET claimed_at = ? '
+                                   'WHERE game_id = ? AND drive_id = ? AND worker_id = ?',
+                                   [(now, game_id, drive_id, worker_id) for game_id, drive_id in claims])
+
+    ### MAINTENANCE ###
+
+    def prune(self, max_age=7 * 24 * 60 * 60):
+        cutoff = time.time() - max_age
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM posted_drives WHERE posted_at < ?', (cutoff,))
+            connection.execute('DELETE FROM seen_drives WHERE seen_at < ?', (cutoff,))
+            connection.execute('DELETE FROM finished_games WHERE updated_at < ?', (cutoff,))
+            connection.execute('DELETE FROM published_games WHERE published_at < ?', (cutoff,))
+            connection.execute('DELETE FROM drive_claims WHERE claimed_at < ?', (cutoff,))
+            connection.execute('DELETE FROM schedule WHERE kickoff < ?', (cutoff,))
@@ -0,0 +1,102 @@
+"""
+Selective decoding of ESPN game summaries.
+
+A summary runs to hundreds of KB, but the bot only reads `header`,
+`drives` and `boxscore.teams`. Rather than decoding the whole payload, the
+decoder finds those subtrees in the raw text and decodes only them. If the
+payload doesn't have the expected shape, it falls back to decoding
+everything.
+"""
+
+import json
+
+decoder = json.JSONDecoder()
+
+
+class UnexpectedSummaryShape(ValueError):
+    pass
+
+
+def skip_whitespace(text, index):
+    while text[index] in ' \t\r\n':
+        index += 1
+    return index
+
+
+def find_value_start(text, key):
+    """
+    Find where the value of the first occurrence of a key starts.
+
+    Returns:
+        int: Index of the value's first character, or None if the key is absent.
+    """
+    quoted_key = '"' + key + '"'
+    needle = quoted_key + ':'
+    index = text.find(needle)
+    if index == -1:
+        if quoted_key in text:
+            # Formatted differently than expected (e.g. whitespace before the colon)
+            raise UnexpectedSummaryShape(f"Couldn't locate {key}")
+        return None
+    return skip_whitespace(text, index + len(needle))
+
+
+def decode_value(text, key, expected_type):
+    index = find_value_start(text, key)
+    if index is None:
+        return None
+    value, _ = decoder.raw_decode(text, index)
+    if not isinstance(value, expected_type):
+        raise UnexpectedSummaryShape(f"{key} is a {type(value).__name__}")
+    return value
+
+
+def decode_boxscore_teams(text):
+    index = find_value_start(text, 'boxscore')
+    if index is None:
+        return None
+    # The boxscore starts with its teams, so skip decoding the players after them
+    teams_key = '{"teams":'
+    if text.startswith(teams_key, index):
+        teams, _ = decoder.raw_decode(text, skip_whitespace(text, index + len(teams_key)))
+    else:
+        teams = decoder.raw_decode(text, index)[0].get('teams', [])
+    if not isinstance(teams, list) or not all(isinstance(team, dict) and 'team' in team for team in teams):
+        raise UnexpectedSummaryShape("Unexpected boxscore teams")
+    return teams
+
+
+def decode_selected(content):
+    text = content.decode('utf-8') if isinstance(content, bytes) else content
+    # Keys are matched by their first occurrence, so check that what was
+    # decoded is the top-level section and not a nested key of the same name
+    header = decode_value(text, 'header', dict)
+    if header is None or not isinstance(header.get('competitions'), list):
+        raise UnexpectedSummaryShape("Missing header")
+
+    summary = {'header': header}
+    drives = decode_value(text, 'drives', dict)
+    if drives is not None and not {'previous', 'current'} & drives.keys():
+        raise UnexpectedSummaryShape("Unexpected drives")
+    if drives is not None:
+        summary['drives'] = drives
+    teams = decode_boxscore_teams(text)
+    if teams is not None:
+        summary['boxscore'] = {'teams': teams}
+    return summary
+
+
+def decode_summary(content):
+    """
+    Decode the parts of a raw ESPN game summary that the bot uses.
+
+    Parameters:
+        content: The raw response body, as bytes or str.
+
+    Returns:
+        dict: A summary with `header`, `drives` and `boxscore.teams`.
+    """
+    try:
+        return decode_selected(content)
+    except (ValueError, IndexError, AttributeError):
+        return json.loads(content)
@@ -1,5 +1,8 @@
-def time_print(message):
-    print(message)
+import logging
+import numpy as np
+from situational_index import situation_keys
+
+logger = logging.getLogger(__name__)
 
 # Dictionary of teams (reversed for easier lookup by ID)
 teams = { 
@@ -12,15 +15,116 @@ teams = {
     '10': 'TEN', '28': 'WSH'
 }
 
+
+# Every factor is defined once, for one punt, below. The batch functions look
+# the factors up in tables of those functions' values, and call them directly
+# for anything outside the tables, so both paths agree bit for bit (NumPy's
+# vectorized pow can differ in the last place, which breaks ties).
+
+
+def field_pos_score(yard_line, in_opposing_territory):
+    if yard_line != yard_line:
+        # Unparseable field positions score 0
+        return 0.
+    if yard_line == 50:
+        return (1.1)**10.
+    if in_opposing_territory:
+        return (1.2)**(50 - yard_line) * ((1.1)**(10))
+    return max(1., (1.1)**(yard_line - 40))
+
+
+def yds_to_go_multiplier(distance):
+    if distance >= 10:
+        return 0.2
+    elif distance >= 7:
+        return 0.4
+    elif distance >= 4:
+        return 0.6
+    elif distance >= 2:
+        return 0.8
+    else:
+        return 1.
+
+
+def score_multiplier(score_diff):
+    if score_diff > 0:
+        return 1.
+    elif score_diff == 0:
+        return 2.
+    elif score_diff < -8.:
+        return 3.
+    else:
+        return 4.
+
+
+def quarter_length(quarter, is_postseason):
+    # Regular season games have only one overtime of length 10 minutes
+    return 10 * 60 if not is_postseason and quarter == 5 else 15 * 60
+
+
+def seconds_since_halftime(quarter, clock_seconds, quarter_length):
+    # Plain arithmetic, so it works on one punt and on arrays alike
+    return quarter_length - clock_seconds + (15 * 60) * (quarter - 3)
+
+
+def is_trailing_late(score_diff, quarter):
+    # Works on one punt and on arrays alike
+    return (score_diff <= 0) & (quarter > 2)
+
+
+def clock_multiplier(seconds_since_halftime, is_trailing_late):
+    if not is_trailing_late:
+        return 1.
+    return ((max(int(seconds_since_halftime), 0) * 0.001)**3.) + 1.
+
+
+def tabulate(function, size, first=0):
+    """
+    Returns:
+        tuple: Arrays of function(value, False) and function(value, True) for
+               value = first, first + 1, ... first + size - 1.
+    """
+    return tuple(np.array([float(function(value, flag)) for value in range(first, first + size)])
+                 for flag in (False, True))
+
+
+def lookup(function, tables, values, flags, first=0):
+    """
+    Apply a factor function of a value and a flag to arrays through its
+    tables, calling it directly for values the tables don't cover.
+    """
+    values = np.asarray(values)
+    flags = np.asarray(flags, dtype=bool)
+    index = values - first
+    with np.errstate(invalid='ignore'):
+        in_table = (index >= 0) & (index < len(tables[0])) & (index == np.floor(index))
+    table_index = np.where(in_table, index, 0).astype(np.intp)
+    result = np.where(flags, tables[1][table_index], tables[0][table_index])
+    if not in_table.all():
+        with np.errstate(invalid='ignore'):
+            result = np.where(in_table, result, np.vectorize(function, otypes=[np.float64])(values, flags))
+    return result
+
+
+FIELD_POS_SCORES = tabulate(field_pos_score, 51)
+YDS_TO_GO_MULTIPLIERS = tabulate(lambda distance, _: yds_to_go_multiplier(distance), 100)
+SCORE_MULTIPLIERS = tabulate(lambda score_diff, _: score_multiplier(score_diff), 201, first=-100)
+QUARTER_LENGTHS = tabulate(quarter_length, 10)
+CLOCK_MULTIPLIERS = tabulate(clock_multiplier, 2 * 60 * 60)
+
+
 class SurrenderIndex:
 
     @staticmethod
-    def is_in_opposing_territory(play):
-        team_id = str(play['start']['team']['id'])
+    def is_in_opposing_territory(play, team_abbreviations=None):
+        team_id = play.start.team_id
+        if team_id is None:
+            raise ValueError("Play has no possessing team")
         
-        team_abbreviation = teams.get(team_id) # -> MIA
+        # Games from the summary API know their own teams, for any league
+        team_abbreviation = (team_abbreviations or teams).get(team_id) # -> MIA
         
-        possession_text = play['start']['possessionText'] # e.g. MIA 34
+        possession_text = play.start.possession_text # e.g. MIA 34
         
         if team_abbreviation and team_abbreviation in possession_text:
             # Team is on their own side
@@ -31,140 +135,192 @@ class SurrenderIndex:
 
     @staticmethod
     def is_in_opposing_territory_original(play):
-        print(play['start'])
-        print(play['start']['yardsToEndzone'])
-        return play['start']['yardsToEndzone'] < 50
+        return play.start.yards_to_endzone < 50
 
     def get_debug_str(play):
         opposing = "In Opponents Territory: " + str(SurrenderIndex.is_in_opposing_territory(play))
-        yards = "Yards to Endzone: " + str(play['start']['yardsToEndzone'])
-        yardline = "Current Yardline: " + str(play['start']['yardLine'])
+        yards = "Yards to Endzone: " + str(play.start.yards_to_endzone)
+        yardline = "Current Yardline: " + str(play.start.yard_line)
         return "\nDebug:\n" + opposing + "\n" + yards + "\n" + yardline
     
     @staticmethod
     def get_yrdln_int(play):
-        if play['start']['yardLine'] == 50:
+        if play.start.yard_line == 50:
             return 50
-        return int(play['start']['possessionText'].split(' ')[1])
+        return int(play.start.possession_text.split(' ')[1])
     
     @staticmethod
     def get_qtr_num(play):
-        return play['period']['number']
+        return play.period
 
 
     @staticmethod
-    def calc_score_diff(play, drive, game, debug=False):
-        away, home = play['awayScore'], play['homeScore']
+    def calc_score_diff(play, drive, game):
+        away, home = play.away_score, play.home_score
         if SurrenderIndex.get_possessing_team(play, game) == SurrenderIndex.get_home_team(game):
             score_diff = home - away
         else:
             score_diff = away - home
-        if debug:
-            time_print(("score diff", score_diff))
         return score_diff
 
     @staticmethod
     def get_possessing_team(play, game):
-        team_id = play.get('start', {}).get('team', {}).get('id')
-        if not team_id:
-            team_id = play.get('end', {}).get('team', {}).get('id')
-        for team in game.game_summary['boxscore']['teams']:
-            if team['team']['id'] == team_id:
-                return team['team']['abbreviation']
+        return game.summary.get_possessing_team(play)
     
     @staticmethod
     def get_home_team(game):
-        return game.game_summary['boxscore']['teams'][1]['team']['abbreviation']
+        return game.home_team
 
 
     @staticmethod
-    def calc_field_pos_score(play):
+    def get_field_position(play, team_abbreviations=None):
+        """
+        Get the line of scrimmage as an integer and whether it is in opposing territory.
+
+        Returns:
+            tuple: (yard line, in opposing territory). The yard line is NaN if
+                   the play's field position can't be parsed.
+        """
         try:
-            print("IS IN OPPOSING TERRITORY?")
-            time_print(SurrenderIndex.is_in_opposing_territory(play))
-            if play['start']['yardLine'] == 50:
-                return (1.1)**10.
-            if not SurrenderIndex.is_in_opposing_territory(play):
-                return max(1., (1.1)**(SurrenderIndex.get_yrdln_int(play) - 40))
-            else:
-                return (1.2)**(50 - SurrenderIndex.get_yrdln_int(play)) * ((1.1)**(10))
+            return (float(SurrenderIndex.get_yrdln_int(play)),
+                    SurrenderIndex.is_in_opposing_territory(play, team_abbreviations))
         except BaseException:
-            return 0.
+            return np.nan, False
 
     @staticmethod
     def get_dist_num(play):
-        return play['start']['distance']
-
-    @staticmethod
-    def calc_yds_to_go_multiplier(play):
-        dist = SurrenderIndex.get_dist_num(play)
-        if dist >= 10:
-            return 0.2
-        elif dist >= 7:
-            return 0.4
-        elif dist >= 4:
-            return 0.6
-        elif dist >= 2:
-            return 0.8
-        else:
-            return 1.
-
-    @staticmethod
-    def calc_score_multiplier(prev_play, drive, game):
-        score_diff = SurrenderIndex.calc_score_diff(prev_play, drive, game)
-        if score_diff > 0:
-            return 1.
-        elif score_diff == 0:
-            return 2.
-        elif score_diff < -8.:
-            return 3.
-        else:
-            return 4.
+        return play.start.distance
 
     @staticmethod
     def calc_seconds_from_time_str(time_str):
         minutes, seconds = map(int, time_str.split(":"))
         return minutes * 60 + seconds
 
-    @staticmethod
-    def calc_clock_multiplier(play, prev_play, drive, game):
-        if SurrenderIndex.calc_score_diff(prev_play, drive, game) <= 0 and SurrenderIndex.get_qtr_num(play) > 2:
-            seconds_since_halftime = SurrenderIndex.calc_seconds_since_halftime(play, game)
-            return ((seconds_since_halftime * 0.001)**3.) + 1.
-        else:
-            return 1.
-    
     @staticmethod
     def get_time_str(play):
-        return play['clock']['displayValue']
-    
+        return play.clock_display
+
     @staticmethod
-    def calc_seconds_since_halftime(play, game, debug=True):
-        # Regular season games have only one overtime of length 10 minutes
-        if not game.is_postseason and SurrenderIndex.get_qtr_num(play) == 5:
-            seconds_elapsed_in_qtr = (10 * 60) - SurrenderIndex.calc_seconds_from_time_str(
-                SurrenderIndex.get_time_str(play))
-        else:
-            seconds_elapsed_in_qtr = (15 * 60) - SurrenderIndex.calc_seconds_from_time_str(
-                SurrenderIndex.get_time_str(play))
-        seconds_since_halftime = max(
-            seconds_elapsed_in_qtr + (15 * 60) * (SurrenderIndex.get_qtr_num(play) - 3), 0)
-        if debug:
-            time_print(("seconds since halftime", seconds_since_halftime))
-        return seconds_since_halftime
+    def get_clock_seconds(play):
+        # Parsed once when the summary is fetched
+        if play.clock_seconds is None:
+            return SurrenderIndex.calc_seconds_from_time_str(SurrenderIndex.get_time_str(play))
+        return play.clock_seconds
+
+    @staticmethod
+    def calc_field_pos_scores(yard_line, in_opposing_territory):
+        return lookup(field_pos_score, FIELD_POS_SCORES, yard_line, in_opposing_territory)
+
+    @staticmethod
+    def calc_yds_to_go_multipliers(distance):
+        return lookup(lambda distance, _: yds_to_go_multiplier(distance), YDS_TO_GO_MULTIPLIERS, distance, False)
+
+    @staticmethod
+    def calc_score_multipliers(score_diff):
+        return lookup(lambda score_diff, _: score_multiplier(score_diff), SCORE_MULTIPLIERS, score_diff, False,
+                      first=-100)
+
+    @staticmethod
+    def calc_seconds_since_halftime(quarter, clock_seconds, is_postseason):
+        quarter = np.asarray(quarter)
+        return seconds_since_halftime(quarter, np.asarray(clock_seconds),
+                                      lookup(quarter_length, QUARTER_LENGTHS, quarter, is_postseason))
+
+    @staticmethod
+    def calc_clock_multipliers(score_diff, quarter, clock_seconds, is_postseason):
+        return lookup(clock_multiplier, CLOCK_MULTIPLIERS,
+                      SurrenderIndex.calc_seconds_since_halftime(quarter, clock_seconds, is_postseason),
+                      is_trailing_late(np.asarray(score_diff), np.asarray(quarter)))
+
+    @staticmethod
+    def calc_surrender_index_factors(yard_line, in_opposing_territory, distance, score_diff,
+                                     quarter, clock_seconds, is_postseason):
+        """
+        Calculate every Surrender Index factor for a batch of punts.
+
+        Parameters:
+            yard_line: Line of scrimmage as 0-50 from the nearest end zone (NaN if unknown).
+            in_opposing_territory: True if the punting team is in opposing territory.
+            distance: Yards to go for a first down.
+            score_diff: Score differential of the punting team.
+            quarter: Quarter number (5+ for overtime).
+            clock_seconds: Seconds remaining on the quarter's clock.
+            is_postseason: True for postseason (15 minute overtime) games.
+
+        Returns:
+            tuple: Arrays of field position scores, yards to go, score and clock multipliers.
+        """
+        return (SurrenderIndex.calc_field_pos_scores(yard_line, in_opposing_territory),
+                SurrenderIndex.calc_yds_to_go_multipliers(distance),
+                SurrenderIndex.calc_score_multipliers(score_diff),
+                SurrenderIndex.calc_clock_multipliers(score_diff, quarter, clock_seconds, is_postseason))
+
+    @staticmethod
+    def calc_surrender_indices(yard_line, in_opposing_territory, distance, score_diff,
+                               quarter, clock_seconds, is_postseason):
+        """
+        Calculate the Surrender Index for a batch of punts given as columnar arrays.
+
+        See calc_surrender_index_factors for the parameters.
+
+        Returns:
+            np.ndarray: The surrender index of every punt.
+        """
+        field_pos_score, yds_to_go_mult, score_mult, clock_mult = SurrenderIndex.calc_surrender_index_factors(
+            yard_line, in_opposing_territory, distance, score_diff, quarter, clock_seconds, is_postseason)
+        return field_pos_score * yds_to_go_mult * score_mult * clock_mult
+
+    @staticmethod
+    def get_factor_inputs(play, prev_play, drive, game):
+        """
+        Returns:
+            tuple: One-element lists of the calc_surrender_index_factors parameters for a punt.
+        """
+        yard_line, in_opposing_territory = SurrenderIndex.get_field_position(
+            play, game.summary.teams if game.summary else None)
+        return ([yard_line], [in_opposing_territory],
+                [SurrenderIndex.get_dist_num(play)],
+                [SurrenderIndex.calc_score_diff(prev_play, drive, game)],
+                [SurrenderIndex.get_qtr_num(play)],
+                [SurrenderIndex.get_clock_seconds(play)],
+                [game.is_postseason])
+
+    @staticmethod
+    def calc_situation_key(play, prev_play, drive, game):
+        """
+        Returns:
+            int: The punt's situation key in the situational index.
+        """
+        _, in_opposing_territory, distance, score_diff, quarter, _, _ = SurrenderIndex.get_factor_inputs(
+            play, prev_play, drive, game)
+        return int(situation_keys(distance, score_diff, in_opposing_territory, quarter)[0])
+
+    @staticmethod
+    def calc_play_factors(yard_line, in_opposing_territory, distance, score_diff,
+                          quarter, clock_seconds, is_postseason):
+        """
+        Calculate the Surrender Index factors of a single punt, without
+        NumPy's per-call overhead. See calc_surrender_index_factors for the
+        parameters.
+
+        Returns:
+            tuple: Field position score, yards to go, score and clock multipliers.
+        """
+        return (field_pos_score(yard_line, in_opposing_territory),
+                yds_to_go_multiplier(distance),
+                score_multiplier(score_diff),
+                clock_multiplier(seconds_since_halftime(quarter, clock_seconds,
+                                                        quarter_length(quarter, is_postseason)),
+                                 is_trailing_late(score_diff, quarter)))
 
     @classmethod
-    def calc_surrender_index(self, play, prev_play, drive, game, debug=True):
-        field_pos_score = SurrenderIndex.calc_field_pos_score(play)
-        yds_to_go_mult = SurrenderIndex.calc_yds_to_go_multiplier(play)
-        score_mult = SurrenderIndex.calc_score_multiplier(prev_play, drive, game)
-        clock_mult = SurrenderIndex.calc_clock_multiplier(play, prev_play, drive, game)
-        #TODO: Formalize Debug setting
-        if debug:
-            time_print(play)
-            time_print("")
-            time_print(("field pos score", field_pos_score))
-            time_print(("yds to go mult", yds_to_go_mult))
-            time_print(("score mult", score_mult))
-            time_print(("clock mult", clock_mult))
+    def calc_surrender_index(self, play, prev_play, drive, game):
+        # One punt at a time takes the scalar path; rebuilds use the batch functions
+        inputs = [value[0] for value in SurrenderIndex.get_factor_inputs(play, prev_play, drive, game)]
+        in_opposing_territory = inputs[1]
+        field_pos_score, yds_to_go_mult, score_mult, clock_mult = SurrenderIndex.calc_play_factors(*inputs)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Play %s: in opposing territory %s, field pos score %s, yds to go mult %s, "
+                         "score mult %s, clock mult %s", play.id, in_opposing_territory, field_pos_score,
+                         yds_to_go_mult, score_mult, clock_mult)
         return field_pos_score * yds_to_go_mult * score_mult * clock_mult
@@ -13,56 +13,79 @@ Inspired by SB Nation's Jon Bois @jon_bois.
 Restructured and setup for Mastodon by @tom@tomkahe.com
 """
 
+import time
+# Imports are the first phase of the startup timing breakdown
+IMPORT_START = time.perf_counter()
+
 import argparse
-from base64 import urlsafe_b64encode
-from datetime import datetime, timedelta, timezone
-from dateutil import parser, tz
-import espn_scraper as espn
+import functools
+from datetime import datetime, timedelta
+from dateutil import tz
 import json
+import logging
 import numpy as np
 import os
-import pickle
 import requests
-from requests.adapters import HTTPAdapter, Retry
-import scipy.stats as stats
-from subprocess import Popen, PIPE
-import sys
 import threading
-import time
-import traceback
-import time
-from datetime import datetime
-import pytz
-from mastodon_utils import MastodonBot
+from mastodon_utils import FakeMastodonBot, MastodonBot
+from current_season_log import CurrentSeasonLog
+from game_fetcher import GameFetcher
+from game_leases import SHARDING_ROLES, GameLeaseManager
+from historical_store import HistoricalIndexStore
+from job_queue import JobQueue
+from metrics import (CYCLE_SECONDS, PUNT_POST_LATENCY_SECONDS, PUNTS_POSTED, SCAN_SECONDS,
+                     MetricsFileWriter, StartupTimer, start_metrics_server)
+from percentile_engine import PercentileEngine, SketchPercentileEngine
+from poll_scheduler import PollScheduler
+from posting_pipeline import PostingPipeline
+from punt_confirmation import CONFIRMATION_STRATEGIES, PuntConfirmation
+from quantile_sketch import TDigest
+from punt_store import PuntStore
+from schedule_cache import ScheduleCache
+from situational_index import SituationalIndex, describe_situation, situation_keys
+from state_store import StateStore
 from surrender_index import SurrenderIndex
+from league import ESPN_API_ROOT, LEAGUES
 from nfl_game import NFLGame
 
-# A dictionary of plays that have already been tweeted.
-tweeted_plays = None
-
-# A dictionary of the currently active games.
-games = {}
-
-# The authenticated Tweepy APIs.
-api, ninety_api = None, None
+logger = logging.getLogger(__name__)
 
-# NPArray of historical surrender indices.
-historical_surrender_indices = None
+# Mastodon's default status length limit
+MAX_STATUS_LENGTH = 500
+# Situations with fewer historical punts aren't worth comparing to
+MIN_SITUATION_PUNTS = 100
 
-# Whether the bot should tweet out any punts
-should_tweet = True
 
-### SELENIUM FUNCTIONS ###
-
-
-### PERCENTILE FUNCTIONS ###
 class SurrenderIndexBot:
-    def __init__(self):
+    def __init__(self, state_path='surrender_index_state.db', punt_store_dir=''):
+        """
+        Parameters:
+            state_path: SQLite database the bot's state is kept in.
+            punt_store_dir: Directory holding each league's punt store.
+        """
+        self.startup_timer = StartupTimer(IMPORT_START)
+        self.startup_timer.mark('imports')
         self.tweeted_plays = {}
+        # Game ID -> drives whose post is queued; they're marked posted once it's sent
+        self.posting_plays = {}
         self.games = {}
         self.api = None
         self.ninety_api = None
-        self.historical_surrender_indices = None
+        self.leagues = [LEAGUES['nfl']]
+        self.historical_stores = {}
+        self.percentile_engines = {}
+        # exact, or sketch for t-digest estimates in bounded memory
+        self.percentile_mode = 'exact'
+        self.sketch_compression = 200
+        # Whether posts add the punt's percentile among punts in the same situation
+        self.situational_context = False
+        self.situational_indices = {}
+        self.punt_store_dir = punt_store_dir
+        self.punt_stores = {}
+        # Posted punts are saved from the posting pipeline's threads, so the percentile
+        # engines, own_index_ids and punt stores are only touched under this lock
+        self.index_lock = threading.RLock()
+        self.state_store = StateStore(state_path)
         self.should_tweet = True
         self.should_text = True
         self.enable_main_account = True
@@ -78,25 +101,51 @@ class SurrenderIndexBot:
         self.completed_game_ids = set()
         self.final_games = set()
         self.session = None
-        self.mastodon_acc = MastodonBot()
-        self.mastodon_acc_90 = MastodonBot("ninety_config.toml")
-        
-        # Load historical surrender indices
-        self.historical_surrender_indices = self.load_historical_surrender_indices()
+        self.game_fetcher = None
+        self.fetch_workers = 8
+        self.fetch_deadline = 20
+        self.poll_scheduler = PollScheduler()
+        self.punt_confirmation = PuntConfirmation()
+        self.job_queue = JobQueue(self.state_store)
+        self.posting_pipeline = PostingPipeline()
+        self.schedule = ScheduleCache(self.state_store)
+        self.current_week_games = []
+        self.espn_api_root = ESPN_API_ROOT
+        self.recorder = None
+        self.metrics_writer = None
+        # When each punt awaiting confirmation was first seen
+        self.punt_seen_times = {}
+        # League key -> (main account, 90th percentile account)
+        self.mastodon_accounts = {}
+        # Sharding: standalone, coordinator or worker, and a worker's leases
+        self.role = 'standalone'
+        self.lease_manager = None
+        self.published_games = {}
+        # League key -> ID of the last current-season index loaded from the store
+        self.current_index_cursors = {}
+        self.own_index_ids = set()
+
+        self.migrate_legacy_state()
+        self.startup_timer.mark('state')
+
+        self.job_queue.register('boost', self.run_boost_job)
+        self.job_queue.register('delay_of_game_reply', self.run_delay_of_game_reply_job)
+        self.job_queue.register('cancel_poll', self.run_cancel_poll_job)
+        self.job_queue.register('poll_check', self.run_poll_check_job)
+        self.job_queue.register('cancel', self.run_cancel_job)
     
     ### TEAM ABBREVIATION FUNCTIONS ###
 
     def get_home_team(self, game):
-        return game.game_summary['boxscore']['teams'][1]['team']['abbreviation']
+        return game.home_team
 
 
     def get_away_team(self, game):
-        return game.game_summary['boxscore']['teams'][0]['team']['abbreviation']
+        return game.away_team
 
 
     def return_other_team(self, game, team):
-        return self.get_away_team(game) if self.get_home_team(
-            game) == team else self.get_home_team(game)
+        return game.summary.return_other_team(team)
 
     def get_active_game_ids(self):
         now = self.get_now()
@@ -105,50 +154,154 @@ class SurrenderIndexBot:
         for game in self.current_week_games:
             if game.id in self.completed_game_ids:
                 continue
+            if self.lease_manager is not None and not self.lease_manager.holds(game.id):
+                continue
             if game.is_starting_soon:
                 active_game_ids.add(game)
 
         return active_game_ids
     
-    def time_print(self, message):
-        print(self.get_current_time_str() + ": " + str(message))
-
-    def get_current_time_str(self):
-        return datetime.now().strftime("%b %-d at %-I:%M:%S %p")
-    
     def send_error_message(self, e, body="An error occurred"):
-        print(e)
+        # Callers have already logged the error
+        logger.debug("Not notifying maintainer of error: %s: %s", body, e)
         #TODO: Add method to alert maintainer of error
         #if self.should_text:
         #    self.send_message(body + ": " + str(e) + ".")
 
     def download_data_for_active_games(self):
+        if self.lease_manager is not None:
+            self.refresh_shard()
+        elif any(self.schedule.refresh_due(league, self.espn_api_root) for league in self.leagues):
+            self.update_current_week_games()
+
         active_game_ids = self.get_active_game_ids()
         if len(active_game_ids) == 0:
-            self.time_print("No games active. Sleeping for 15 minutes...")
-            time.sleep(14 * 60)  # We sleep for another minute in the live callback
-
-        for game in active_game_ids:
-            game.update_game_summary(self.session)
-
-        self.live_callback()
-
-    def cancel_punt(self, orig_status, full_text):
-        self.mastodon_acc_90.unboost(orig_status['id'])
-        self.mastodon_acc_90.post('CANCELED', reply_id=orig_status['id'])
-
-    def handle_cancel(self, orig_status, full_text):
+            self.startup_timer.finish('first_cycle')
+            if self.lease_manager is not None:
+                # Other workers' games can become free at any time
+                time.sleep(self.lease_manager.renew_interval)
+                return
+            self.sleep_until_next_game()
+            return
+
+        # Only games that are due are fetched, and they are scanned as their summaries arrive
+        due_time = time.time()
+        due_games = self.poll_scheduler.due_games(active_game_ids, due_time)
+        try:
+            with CYCLE_SECONDS.time():
+                self.live_callback(self.game_fetcher.fetch_summaries(due_games))
+        finally:
+            # Games whose fetch failed, timed out or is still running aren't scanned, and back off
+            self.poll_scheduler.schedule_missed(due_games, due_time)
+        self.startup_timer.finish('first_cycle')
+
+        sleep_time = self.poll_scheduler.seconds_until_next_poll(self.get_active_game_ids())
+        if self.lease_manager is not None:
+            sleep_time = min(sleep_time, self.lease_manager.renew_interval)
+        time.sleep(sleep_time)
+
+    def sleep_until_next_game(self):
+        now = self.get_now()
+        league_keys = [league.key for league in self.leagues]
+        wake_time = self.schedule.next_wake_time(league_keys, now.timestamp())
+        next_kickoff = self.schedule.next_kickoff(league_keys, now.timestamp())
+        logger.info("No games active. Sleeping until %s (next kickoff %s)",
+                    datetime.fromtimestamp(wake_time, tz=now.tzinfo).strftime('%a %H:%M'),
+                    datetime.fromtimestamp(next_kickoff, tz=now.tzinfo).strftime('%a %H:%M')
+                    if next_kickoff else 'not scheduled')
+        time.sleep(max(wake_time - now.timestamp(), 1))
+        # Check for late changes before the games become active
+        self.update_current_week_games(force=True)
+
+    ### SHARDING ###
+
+    def enable_worker(self, worker_id=None, lease_seconds=60):
+        self.role = 'worker'
+        self.lease_manager = GameLeaseManager(self.state_store, worker_id, lease_seconds)
+        # Every worker records its punts in the shared store, so each one's
+        # current season is rebuilt from there and kept in sync every cycle
+        for league in self.leagues:
+            self.percentile_engines[league.key] = self.load_percentile_engine(league.key, current_indices=[])
+            self.current_index_cursors[league.key] = 0
+        self.sync_current_indices()
+
+    def publish_current_week_games(self):
+        self.state_store.publish_games([(game.id, game.league.key, game.event_info)
+                                        for game in self.current_week_games])
+        logger.info("Published %d games; leases held: %s", len(self.current_week_games),
+                    self.state_store.load_leases() or 'none')
+
+    def load_published_games(self):
+        # Game objects are kept across cycles, since they hold each game's fetch and scan state
+        league_keys = {league.key for league in self.leagues}
+        for game_id, league_key, event_info in self.state_store.load_published_games():
+            if league_key not in league_keys:
+                continue
+            game = self.published_games.get(game_id)
+            if game is None:
+                self.published_games[game_id] = NFLGame(event_info, LEAGUES[league_key], self.espn_api_root)
+            else:
+                game.update_event_info(event_info)
+        self.current_week_games = list(self.published_games.values())
+
+    def sync_current_indices(self):
+        with self.index_lock:
+            for league in self.leagues:
+                rows = self.state_store.load_current_indices_after(league.key,
+                                                                   self.current_index_cursors[league.key])
+                engine = self.percentile_engines[league.key]
+                for index_id, surrender_index in rows:
+                    # This worker's own punts are already in its engine
+                    if index_id in self.own_index_ids:
+                        self.own_index_ids.discard(index_id)
+                    else:
+                        engine.add(surrender_index)
+                if rows:
+                    self.current_index_cursors[league.key] = rows[-1][0]
+
+    def refresh_shard(self):
+        self.load_published_games()
+        # Games completed by other workers
+        self.completed_game_ids |= self.state_store.load_finished()[1]
+
+        candidates = [game.id for game in self.current_week_games
+                      if game.id not in self.completed_game_ids and game.is_starting_soon]
+        acquired = self.lease_manager.acquire(candidates)
+        if acquired:
+            # Pick up what the games' previous workers posted and saw
+            logger.info("Leased %d new games (%d held)", len(acquired), len(self.lease_manager.held))
+            self.tweeted_plays = self.state_store.load_posted()
+            self.seen_plays = self.state_store.load_seen()
+
+        self.sync_current_indices()
+
+    def run_coordinator(self, stop_date, refresh_interval=5 * 60):
+        while self.get_now() < stop_date:
+            time.sleep(refresh_interval)
+            # Conditional requests, so an unchanged scoreboard costs one round trip
+            if self.update_current_week_games(force=True):
+                self.publish_current_week_games()
+
+    def cancel_punt(self, orig_status, full_text, league='nfl'):
+        ninety_account = self.get_ninety_account(league)
+        ninety_account.unboost(orig_status['id'])
+        ninety_account.post('CANCELED', reply_id=orig_status['id'])
+
+    def handle_cancel(self, orig_status, full_text, league='nfl'):
         # Post poll in reply to original status
         options = ['Yes', 'No']
-        poll = self.mastodon_acc.make_simple_poll(options)
-        status = self.mastodon_acc_90.post("Should this punt's Surrender Index be canceled?", reply_id=orig_status['id'], poll=poll)
-        
-        if self.check_reply(status):
-            self.cancel_punt(orig_status, full_text)
+        poll = self.get_main_account(league).make_simple_poll(options)
+        status = self.get_ninety_account(league).post("Should this punt's Surrender Index be canceled?",
+                                                      reply_id=orig_status['id'], poll=poll)
 
-    def check_reply(self, poll_status):
-        time.sleep(61 * 60)  # Wait one hour and one minute to check reply
-        poll_results = self.mastodon_acc_90.get_poll_result(poll_status['id'])
+        # Wait one hour and one minute to check reply
+        self.job_queue.schedule('poll_check', {'status_id': orig_status['id'],
+                                               'poll_status_id': status['id'],
+                                               'text': full_text,
+                                               'league': league}, delay=61 * 60)
+
+    def check_reply(self, poll_status, league='nfl'):
+        poll_results = self.get_ninety_account(league).get_poll_result(poll_status['id'])
 
         total_votes = sum(option['votes_count'] for option in poll_results)
 
@@ -163,70 +316,156 @@ class SurrenderIndexBot:
 
         return False
 
+    ### DELAYED JOBS ###
+
+    # Jobs queued before multi-league support have no league and are NFL
+
+    def run_boost_job(self, payload):
+        self.get_ninety_account(payload.get('league', 'nfl')).boost(payload['status_id'])
+
+    def run_delay_of_game_reply_job(self, payload):
+        self.get_main_account(payload.get('league', 'nfl')).post(payload['text'], reply_id=payload['status_id'])
+
+    def run_cancel_poll_job(self, payload):
+        self.handle_cancel({'id': payload['status_id']}, payload['text'], payload.get('league', 'nfl'))
+
+    def run_poll_check_job(self, payload):
+        if self.check_reply({'id': payload['poll_status_id']}, payload.get('league', 'nfl')):
+            self.job_queue.schedule('cancel', payload)
+
+    def run_cancel_job(self, payload):
+        self.cancel_punt({'id': payload['status_id']}, payload['text'], payload.get('league', 'nfl'))
+
     def get_now(self):
         return datetime.now(tz=tz.gettz())
 
-    def update_current_week_games(self):
+    def create_mastodon_accounts(self, fake_log_path=None):
+        for league in self.leagues:
+            if fake_log_path:
+                self.mastodon_accounts[league.key] = (FakeMastodonBot(f'{league.key}.main', fake_log_path),
+                                                      FakeMastodonBot(f'{league.key}.ninety', fake_log_path))
+            else:
+                self.mastodon_accounts[league.key] = (MastodonBot(league.main_config),
+                                                      MastodonBot(league.ninety_config))
+
+    def get_main_account(self, league='nfl'):
+        return self.mastodon_accounts[league][0]
+
+    def get_ninety_account(self, league='nfl'):
+        return self.mastodon_accounts[league][1]
+
+    def update_current_week_games(self, force=False):
+        """
+        Refresh the cached schedule where it's due (or everywhere, with
+        `force`), and rebuild the week's games from it.
+
+        Returns:
+            bool: True if any game was added, changed or removed.
+        """
+        changed = False
+        for league in self.leagues:
+            if not force and not self.schedule.refresh_due(league, self.espn_api_root):
+                continue
+            try:
+                changed |= self.schedule.refresh(self.session, league, self.espn_api_root)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                # A cached schedule, or the other leagues, are enough until the next refresh
+                if len(self.leagues) == 1 and not self.schedule.get_events(league.key):
+                    raise
+                logger.warning("Could not load the %s scoreboard: %s", league.name, e)
+
+        # Game objects are kept across refreshes, since they hold each game's fetch and scan state
+        games = {game.id: game for game in self.current_week_games}
         self.current_week_games = []
-
-        espn_data = requests.get(
-            "http://site.api.espn.com/apis/site/v2/sports/football/nfl/scoreboard",
-            timeout=10).json()
-
-        for event in espn_data['events']:
-            self.current_week_games.append(NFLGame(event))
+        for league in self.leagues:
+            for event in self.schedule.get_events(league.key):
+                game = games.get(event['id'])
+                if game is None or game.league is not league:
+                    game = NFLGame(event, league, self.espn_api_root)
+                else:
+                    game.update_event_info(event)
+                self.current_week_games.append(game)
+        return changed
 
     def get_possessing_team(self, play, game):
-        team_id = play.get('start', {}).get('team', {}).get('id')
-        if not team_id:
-            team_id = play.get('end', {}).get('team', {}).get('id')
-        for team in game.game_summary['boxscore']['teams']:
-            if team['team']['id'] == team_id:
-                return team['team']['abbreviation']
+        return game.summary.get_possessing_team(play)
 
     def is_punt(self, drive):
-        return 'punt' in drive.get('result', '').lower()
+        return drive.is_punt()
 
     def get_qtr_num(self, play):
-        return play['period']['number']
+        return play.period
 
     def has_been_tweeted(self, drive, game_id):
-        game_plays = self.tweeted_plays.get(game_id, [])
-        return drive.get('id', '') in game_plays
+        return drive.id in self.tweeted_plays.get(game_id, ())
+
+    def is_being_posted(self, drive, game_id):
+        return drive.id in self.posting_plays.get(game_id, ())
 
     def has_been_seen(self, drive, game_id):
-        game_plays = self.seen_plays.get(game_id, [])
-        if drive.get('id', '') in game_plays:
+        game_plays = self.seen_plays.setdefault(game_id, set())
+        if drive.id in game_plays:
             return True
-        game_plays.append(drive.get('id', ''))
-        self.seen_plays[game_id] = game_plays
+        game_plays.add(drive.id)
+        self.state_store.mark_seen(game_id, drive.id)
+        self.punt_seen_times[(game_id, drive.id)] = time.time()
         return False
 
+    def is_awaiting_confirmation(self, drive_id, game_id):
+        return drive_id in self.seen_plays.get(game_id, ()) and \
+            drive_id not in self.tweeted_plays.get(game_id, ())
+
+    def has_pending_confirmation(self, game_id):
+        # Drives and final statuses seen once are confirmed on the next pass,
+        # even if the summary hasn't changed since
+        if game_id in self.final_games:
+            return True
+        tweeted = self.tweeted_plays.get(game_id, set()) | self.posting_plays.get(game_id, set())
+        return not self.seen_plays.get(game_id, set()) <= tweeted
+
     def has_been_final(self, game_id):
         if game_id in self.final_games:
             return True
         self.final_games.add(game_id)
+        self.state_store.mark_final_seen(game_id)
         return False
 
-    def load_tweeted_plays_dict(self):
-        self.tweeted_plays = {}
-        if os.path.exists('tweeted_plays.json'):
-            file_mod_time = os.path.getmtime('tweeted_plays.json')
-        else:
-            file_mod_time = 0.
-        if time.time() - file_mod_time < 60 * 60 * 12:
-            with open('tweeted_plays.json', 'r') as f:
-                self.tweeted_plays = json.load(f)
-        else:
-            with open('tweeted_plays.json', 'w') as f:
-                json.dump(self.tweeted_plays, f)
+    def mark_game_completed(self, game_id):
+        self.completed_game_ids.add(game_id)
+        self.state_store.mark_completed(game_id)
+
+    def load_state(self):
+        # Warm start: everything posted, seen or finished before a restart
+        self.state_store.prune()
+        self.tweeted_plays = self.state_store.load_posted()
+        self.seen_plays = self.state_store.load_seen()
+        self.final_games, self.completed_game_ids = self.state_store.load_finished()
+
+    def migrate_legacy_state(self):
+        # Import state that earlier versions kept in flat files next to the state database
+        state_dir = os.path.dirname(self.state_store.path)
+        tweeted_plays_path = os.path.join(state_dir, 'tweeted_plays.json')
+        if os.path.exists(tweeted_plays_path):
+            with open(tweeted_plays_path, 'r') as f:
+                for game_id, drive_ids in json.load(f).items():
+                    for drive_id in drive_ids:
+                        self.state_store.mark_posted(game_id, drive_id)
+            os.replace(tweeted_plays_path, tweeted_plays_path + '.migrated')
+
+        legacy_log = CurrentSeasonLog(os.path.join(state_dir, 'current_surrender_indices.log'),
+                                      os.path.join(state_dir, 'current_surrender_indices.snapshot.npz'),
+                                      os.path.join(state_dir, 'current_surrender_indices.npy'))
+        legacy_paths = [legacy_log.path, legacy_log.snapshot_path, legacy_log.legacy_path]
+        if self.state_store.count_current_indices() == 0 and any(os.path.exists(path) for path in legacy_paths):
+            self.state_store.add_current_indices(legacy_log.load())
+            legacy_log.close()
+            for path in legacy_paths:
+                if os.path.exists(path):
+                    os.replace(path, path + '.migrated')
 
     def update_tweeted_plays(self, drive, game_id):
-        game_plays = self.tweeted_plays.get(game_id, [])
-        game_plays.append(drive['id'])
-        self.tweeted_plays[game_id] = game_plays
-        with open('tweeted_plays.json', 'w') as f:
-            json.dump(self.tweeted_plays, f)
+        self.tweeted_plays.setdefault(game_id, set()).add(drive.id)
+        self.state_store.mark_posted(game_id, drive.id)
 
 
     def create_tweet_str(self, play,
@@ -237,50 +476,64 @@ class SurrenderIndexBot:
                         current_percentile,
                         historical_percentile,
                         delay_of_game=False):
-        territory_str = play['start']['possessionText']
+        territory_str = play.start.possession_text
         asterisk = '*' if delay_of_game else ''
 
         decided_str = self.get_possessing_team(
             play, game) + ' decided to punt to ' + self.return_other_team(
                 game, self.get_possessing_team(play, game))
         yrdln_str = ' from the ' + territory_str + asterisk + ' on '
-        down_str = play['start']['shortDownDistanceText'] + asterisk
-        clock_str = ' with ' + play['clock']['displayValue'] + ' remaining in '
-        qtr_str = self.get_qtr_str(play['period']['number']) + \
+        down_str = play.start.short_down_distance_text + asterisk
+        clock_str = ' with ' + play.clock_display + ' remaining in '
+        qtr_str = self.get_qtr_str(play.period) + \
             ' while ' + self.get_score_str(prev_play, game) + '.'
 
         play_str = decided_str + yrdln_str + down_str + clock_str + qtr_str
 
-        surrender_str = 'With a Surrender Index of ' + str(
-            round(surrender_index, 2)
-        ) + ', this punt ranks at the ' + self.get_num_str(
-            current_percentile
-        ) + ' percentile of cowardly punts of the 2024 season, and the ' + self.get_num_str(
-            historical_percentile) + ' percentile of all punts since 1999.'
+        first_season = self.get_first_season(game.league.key)
+        if first_season is None:
+            # Leagues without historical data are only compared to this season
+            surrender_str = 'With a Surrender Index of ' + str(
+                round(surrender_index, 2)
+            ) + ', this punt ranks at the ' + self.get_num_str(
+                current_percentile
+            ) + ' percentile of cowardly punts of the 2024 season.'
+        else:
+            surrender_str = 'With a Surrender Index of ' + str(
+                round(surrender_index, 2)
+            ) + ', this punt ranks at the ' + self.get_num_str(
+                current_percentile
+            ) + ' percentile of cowardly punts of the 2024 season, and the ' + self.get_num_str(
+                historical_percentile) + ' percentile of all punts since ' + str(first_season) + '.'
 
 
         return play_str + '\n\n' + surrender_str
     
     def tweet_play(self, play, prev_play, drive, game, game_id):
+        if self.lease_manager is not None and not self.lease_manager.claim_drive(game_id, drive.id):
+            # Another worker held the game when this drive ended
+            logger.info("Drive %s of game %s is claimed by another worker", drive.id, game_id)
+            if self.state_store.is_posted(game_id, drive.id):
+                self.tweeted_plays.setdefault(game_id, set()).add(drive.id)
+            return
+
         enable_cancel = True
         delay_of_game = self.is_delay_of_game(play, prev_play) 
 
         if delay_of_game:
-            updated_play = play.copy()
-            updated_play['start'] = prev_play['start']
-            updated_play['end'] = prev_play['end']
+            updated_play = play.with_field_position(prev_play)
 
             surrender_index = SurrenderIndex.calc_surrender_index(
                 updated_play, prev_play, drive, game)
 
             current_percentile, historical_percentile = self.calculate_percentiles(
-                surrender_index)
+                surrender_index, should_update_file=False, league=game.league.key)
 
             unadjusted_surrender_index = SurrenderIndex.calc_surrender_index(
                 play, prev_play, drive, game)
 
             unadjusted_current_percentile, unadjusted_historical_percentile = self.calculate_percentiles(
-                unadjusted_surrender_index, should_update_file=False)
+                unadjusted_surrender_index, should_update_file=False, league=game.league.key)
 
             tweet_str = self.create_tweet_str(updated_play, prev_play, drive, game,
                                         surrender_index, current_percentile,
@@ -288,38 +541,141 @@ class SurrenderIndexBot:
         else:
             surrender_index = SurrenderIndex.calc_surrender_index(play, prev_play, drive, game)
             current_percentile, historical_percentile = self.calculate_percentiles(
-                surrender_index)
+                surrender_index, should_update_file=False, league=game.league.key)
             tweet_str = self.create_tweet_str(play, prev_play, drive, game,
                                         surrender_index, current_percentile,
                                         historical_percentile, delay_of_game)
 
-        self.time_print(tweet_str)
+        scored_play = updated_play if delay_of_game else play
+        if self.situational_context:
+            situational_str = self.create_situational_str(scored_play, prev_play, drive, game, surrender_index)
+            if situational_str and len(tweet_str) + 2 + len(situational_str) <= MAX_STATUS_LENGTH:
+                tweet_str += '\n\n' + situational_str
+
+        logger.info(tweet_str)
 
         if delay_of_game:
             delay_of_game_str = self.create_delay_of_game_str(
                 play, drive, game, prev_play, unadjusted_surrender_index,
                 unadjusted_current_percentile, unadjusted_historical_percentile)
-            self.time_print(delay_of_game_str)
+            logger.info(delay_of_game_str)
 
-        main_status = None
-        print(self.should_tweet, self.enable_main_account)
+        league = game.league.key
+        seen_time = self.punt_seen_times.pop((game_id, drive.id), None)
         if self.should_tweet and self.enable_main_account:
-            if True:
-                main_status = self.mastodon_acc.post(tweet_str)
-
-        # Post the status to the 90th percentile account.
-        if current_percentile >= 90. and should_tweet:
-            time.sleep(30) # Attempt to sleep for 30 seconds to fix bluesky bridge issues
-            status = self.mastodon_acc_90.boost(main_status['id'])
-            if delay_of_game:
-                #print(delay_of_game_str)
-                self.mastodon_acc.post(delay_of_game_str, reply_id=main_status['id'])
-            if enable_cancel:
-                thread = threading.Thread(target=self.handle_cancel,
-                                        args=(main_status, tweet_str))
-                thread.start()
-
+            # Posted by the pipeline, so a slow instance doesn't hold up the other games. The key
+            # makes a retry after a timeout return the first status instead of posting twice.
+            # The drive is only marked posted, and its punt saved, once the post is sent, so a post
+            # that's given up or still queued at exit is scored and posted again on a later pass
+            self.posting_plays.setdefault(game_id, set()).add(drive.id)
+            self.posting_pipeline.submit(
+                'post', self.get_main_account(league).post, tweet_str, idempotency_key=f'{game_id}-{drive.id}',
+                key=game_id, on_success=functools.partial(
+                    self.on_punt_posted, game_id=game_id, drive=drive, league=league,
+                    punt=(scored_play, prev_play, drive, game, surrender_index), seen_time=seen_time, tweet_str=tweet_str, current_percentile=current_percentile,
+                    delay_of_game_str=delay_of_game_str if delay_of_game else None,
+                    enable_cancel=enable_cancel),
+                on_failure=functools.partial(self.on_punt_post_failed, game_id=game_id, drive=drive))
+        else:
+            self.save_punt(scored_play, prev_play, drive, game, surrender_index)
+            self.update_tweeted_plays(drive, game_id)
+
+    def save_punt(self, play, prev_play, drive, game, surrender_index):
+        # Once per drive: when its post is sent, or as soon as it's scored if it isn't posted
+        with self.index_lock:
+            self.write_current_surrender_index(surrender_index, game.league.key)
+            self.get_percentile_engine(game.league.key).add(surrender_index)
+            self.record_punt(play, prev_play, drive, game, surrender_index)
+
+    def on_punt_post_failed(self, error, game_id, drive):
+        self.posting_plays.get(game_id, set()).discard(drive.id)
+        if self.lease_manager is not None:
+            self.lease_manager.release_drive(game_id, drive.id)
+        logger.error("Giving up posting drive %s of game %s for now; it's retried on the next pass: %s",
+                     drive.id, game_id, error)
+
+    def on_punt_posted(self, main_status, game_id, drive, league, punt, seen_time, tweet_str, current_percentile,
+                       delay_of_game_str=None, enable_cancel=True):
+        self.save_punt(*punt)
         self.update_tweeted_plays(drive, game_id)
+        self.posting_plays.get(game_id, set()).discard(drive.id)
+        if self.lease_manager is not None:
+            self.lease_manager.release_drive(game_id, drive.id)
+        self.state_store.save_status_id(game_id, drive.id, 'main', main_status['id'])
+        PUNTS_POSTED.inc()
+
+        if seen_time is not None:
+            latency = time.time() - seen_time
+            PUNT_POST_LATENCY_SECONDS.observe(latency)
+            self.punt_confirmation.record_latency(latency)
+            logger.info("Posted %.1fs after the punt was detected (median %.1fs over the last %d punts)",
+                        latency, self.punt_confirmation.median_latency, len(self.punt_confirmation.latencies))
+
+        # Boost the status from the 90th percentile account. Boosts and replies need the
+        # status, so they're only scheduled once it's posted.
+        if current_percentile >= 90.:
+            # Wait 30 seconds before boosting to fix bluesky bridge issues
+            self.job_queue.schedule('boost', {'status_id': main_status['id'], 'league': league}, delay=30)
+            if delay_of_game_str:
+                self.job_queue.schedule('delay_of_game_reply', {'status_id': main_status['id'],
+                                                                'text': delay_of_game_str,
+                                                                'league': league}, delay=30)
+            if enable_cancel:
+                self.job_queue.schedule('cancel_poll', {'status_id': main_status['id'],
+                                                        'text': tweet_str,
+                                                        'league': league}, delay=30)
+
+    def get_punt_store(self, league='nfl'):
+        if league not in self.punt_stores:
+            self.punt_stores[league] = PuntStore(os.path.join(self.punt_store_dir, LEAGUES[league].punt_store_path))
+        return self.punt_stores[league]
+
+    def record_punt(self, play, prev_play, drive, game, surrender_index):
+        yard_line, in_opposing_territory, distance, score_diff, quarter, clock_seconds, _ = \
+            SurrenderIndex.get_factor_inputs(play, prev_play, drive, game)
+        summary = game.summary
+        team = summary.get_possessing_team(play) if summary else None
+        try:
+            self.get_punt_store(game.league.key).append(
+                surrender_index=surrender_index,
+                season=summary.season_year if summary and summary.season_year else datetime.now().year,
+                week=summary.week if summary and summary.week else 0,
+                postseason=game.is_postseason,
+                team=team or '',
+                opponent=(summary.return_other_team(team) if team else None) or '',
+                game_id=str(game.id),
+                quarter=quarter[0],
+                clock_seconds=clock_seconds[0],
+                yard_line=yard_line[0],
+                opposing_territory=in_opposing_territory[0],
+                distance=distance[0],
+                score_diff=score_diff[0],
+                situation=situation_keys(distance, score_diff, in_opposing_territory, quarter)[0])
+        except OSError:
+            # The store is a record of punts, not needed to post them
+            logger.exception("Couldn't record punt of game %s in the punt store", game.id)
+
+    def get_situational_index(self, league='nfl'):
+        if league not in self.situational_indices:
+            index = SituationalIndex(os.path.splitext(self.get_historical_store(league).source_path)[0] + '.sitx')
+            if not index.exists():
+                logger.warning("No situational index at %s; run rebuild_historical.py to build it", index.path)
+                index = None
+            self.situational_indices[league] = index
+        return self.situational_indices[league]
+
+    def create_situational_str(self, play, prev_play, drive, game, surrender_index):
+        situational_index = self.get_situational_index(game.league.key)
+        if situational_index is None:
+            return None
+        key = SurrenderIndex.calc_situation_key(play, prev_play, drive, game)
+        count = situational_index.count(key)
+        if count < MIN_SITUATION_PUNTS:
+            return None
+        percentile = situational_index.percentile(surrender_index, key)
+        return 'Among the ' + str(count) + ' punts since ' + str(situational_index.header['first_season']) + \
+            ' in the same situation (' + describe_situation(key) + '), it ranks at the ' + \
+            self.get_num_str(percentile) + ' percentile.'
 
     def get_qtr_str(self, qtr):
         if qtr <= 4:
@@ -344,44 +700,86 @@ class SurrenderIndexBot:
         else:
             return 'th'
 
-    def load_historical_surrender_indices(self):
-        with open('1999-2024_surrender_indices.npy', 'rb') as f:
-            return np.load(f)
-
-
-    def load_current_surrender_indices(self):
-        try:
-            with open('current_surrender_indices.npy', 'rb') as f:
-                return np.load(f)
-        except BaseException as e:
-            print(e)
-            return np.array([])
-
-
-    def write_current_surrender_indices(self, surrender_indices):
-        with open('current_surrender_indices.npy', 'wb') as f:
-            np.save(f, surrender_indices)
-
-
-    def calculate_percentiles(self, surrender_index, should_update_file=True):
-
-        current_surrender_indices = self.load_current_surrender_indices()
-        current_percentile = stats.percentileofscore(current_surrender_indices,
-                                                    surrender_index,
-                                                    kind='strict')
-        if np.isnan(current_percentile):
-            current_percentile = 100.
-
-        all_surrender_indices = np.concatenate(
-            (self.historical_surrender_indices, current_surrender_indices))
-        historical_percentile = stats.percentileofscore(all_surrender_indices,
-                                                        surrender_index,
-                                                        kind='strict')
-
-        if should_update_file:
-            current_surrender_indices = np.append(current_surrender_indices,
-                                                surrender_index)
-            self.write_current_surrender_indices(current_surrender_indices)
+    def get_historical_store(self, league='nfl'):
+        if league not in self.historical_stores:
+            # Resolved once, so the store, sketch and situational index come from the same rebuild
+            source_path = LEAGUES[league].historical_source_path
+            self.historical_stores[league] = HistoricalIndexStore(os.path.splitext(source_path)[0] + '.sidx',
+                                                                  source_path)
+        return self.historical_stores[league]
+
+    def has_historical_data(self, league='nfl'):
+        store = self.get_historical_store(league)
+        return os.path.exists(store.path) or os.path.exists(store.source_path)
+
+    def get_first_season(self, league='nfl'):
+        if not self.has_historical_data(league):
+            return None
+        return self.get_historical_store(league).header.get('first_season')
+
+    def load_historical_surrender_indices(self, league='nfl'):
+        if not self.has_historical_data(league):
+            return np.array([], dtype=np.float64)
+        # Sorted and memory-mapped, so the pages are shared between processes
+        return self.get_historical_store(league).indices
+
+
+    def load_current_surrender_indices(self, league='nfl'):
+        return self.state_store.load_current_indices(league)
+
+
+    def write_current_surrender_index(self, surrender_index, league='nfl'):
+        index_id = self.state_store.add_current_index(surrender_index, league)
+        if self.lease_manager is not None:
+            self.own_index_ids.add(index_id)
+
+
+    def get_historical_sketch(self, league='nfl'):
+        if not self.has_historical_data(league):
+            return TDigest(self.sketch_compression)
+        store = self.get_historical_store(league)
+        # Written by rebuild_historical.py, or built here from the historical store
+        path = os.path.splitext(store.source_path)[0] + '.tdigest'
+        sources = [source for source in (store.path, store.source_path) if os.path.exists(source)]
+        if os.path.exists(path) and os.path.getmtime(path) >= max(map(os.path.getmtime, sources)):
+            sketch = TDigest.load(path)
+            if sketch.compression == self.sketch_compression:
+                return sketch
+        sketch = TDigest.from_values(store.indices, self.sketch_compression)
+        sketch.save(path)
+        return sketch
+
+    def load_percentile_engine(self, league='nfl', current_indices=None):
+        if current_indices is None:
+            current_indices = self.load_current_surrender_indices(league)
+        if self.percentile_mode == 'sketch':
+            return SketchPercentileEngine(self.get_historical_sketch(league), current_indices,
+                                          self.sketch_compression)
+        return PercentileEngine(self.load_historical_surrender_indices(league), current_indices,
+                                presorted=True)
+
+    def get_percentile_engine(self, league='nfl'):
+        # Each league is compared only to its own punts
+        if league not in self.percentile_engines:
+            self.percentile_engines[league] = self.load_percentile_engine(league)
+        return self.percentile_engines[league]
+
+    def load_percentile_engines(self):
+        for league in self.leagues:
+            self.get_percentile_engine(league.key)
+
+    def calculate_percentiles(self, surrender_index, should_update_file=True, league='nfl'):
+        with self.index_lock:
+            percentile_engine = self.get_percentile_engine(league)
+            current_percentile = percentile_engine.current_percentile(surrender_index)
+            if np.isnan(current_percentile):
+                current_percentile = 100.
+
+            historical_percentile = percentile_engine.combined_percentile(surrender_index)
+
+            if should_update_file:
+                self.write_current_surrender_index(surrender_index, league)
+                percentile_engine.add(surrender_index)
 
         return current_percentile, historical_percentile
 
@@ -391,17 +789,17 @@ class SurrenderIndexBot:
                                 unadjusted_surrender_index,
                                 unadjusted_current_percentile,
                                 unadjusted_historical_percentile):
-        new_territory_str = play['start']['possessionText']
-        old_territory_str = prev_play['start']['possessionText']
+        new_territory_str = play.start.possession_text
+        old_territory_str = prev_play.start.possession_text
 
         penalty_str = "*" + self.get_possessing_team(
             play,
             game) + " committed a (likely intentional) delay of game penalty, "
         old_yrdln_str = "moving the play from " + \
-            prev_play['start']['shortDownDistanceText'] + \
-            " at the " + prev_play['start']['possessionText']
-        new_yrdln_str = " to " + play['start']['shortDownDistanceText'] + \
-            " at the " + play['start']['possessionText'] + ".\n\n"
+            prev_play.start.short_down_distance_text + \
+            " at the " + prev_play.start.possession_text
+        new_yrdln_str = " to " + play.start.short_down_distance_text + \
+            " at the " + play.start.possession_text + ".\n\n"
         index_str = "If this penalty was in fact unintentional, the Surrender Index would be " + \
             str(round(unadjusted_surrender_index, 2)) + ", "
         percentile_str = "ranking at the " + self.get_num_str(
@@ -443,68 +841,105 @@ class SurrenderIndexBot:
 
     def get_score_str(self, play, game):
         if self.get_possessing_team(play, game) == self.get_home_team(game):
-            return self.pretty_score_str(play['homeScore'], play['awayScore'])
+            return self.pretty_score_str(play.home_score, play.away_score)
         else:
-            return self.pretty_score_str(play['awayScore'], play['homeScore'])
+            return self.pretty_score_str(play.away_score, play.home_score)
 
     def is_delay_of_game(self, play, prev_play):
-        return 'delay of game' in prev_play['text'].lower(
+        return 'delay of game' in prev_play.text.lower(
         ) and SurrenderIndex.get_dist_num(play) - SurrenderIndex.get_dist_num(prev_play) > 0
 
 
-    def live_callback(self):
-        active_game_ids = self.get_active_game_ids()
-        start_time = time.time()
-        for game in active_game_ids:
-            self.time_print('Getting data for game ID ' + game.id)
-            for index, drive in enumerate(game.previous_drives):
-                if 'result' not in drive:
-                    continue
-
-                drive_plays = drive.get('plays', [])
-                if len(drive_plays) < 2:
-                    continue
-
-                if not self.is_punt(drive):
-                    continue
-
-                if self.has_been_tweeted(drive, game.id):
-                    continue
-
-                if not self.has_been_seen(drive, game.id):
-                    continue
-
-                punt = None
-                for index, play in enumerate(drive_plays):
-                    if index == 0:
-                        continue
-                    if 'punt' in play.get('type', {}).get('text', '').lower():
-                        punt = play
-                        prev_play = drive_plays[index - 1]
-
-                if not punt:
-                    punt = drive_plays[-1]
-                    prev_play = drive_plays[-2]
-
-                try:
-                    self.tweet_play(punt, prev_play, drive, game, game.id)
-                except BaseException as e:
-                    traceback.print_exc()
-                    self.time_print("Error occurred:")
-                    self.time_print(e)
-                    error_str = "Failed to tweet play from drive " + \
-                        drive.get('id', '')
-                    self.time_print(error_str)
-                    self.send_error_message(e, error_str)
-
-            if game.is_final:
-                if self.has_been_final(game.id):
-                    self.completed_game_ids.add(game.id)
-        while (time.time() < start_time + 30):
-            time.sleep(1)
-        print("")
-
-    def run(self):
+    def scan_game(self, game):
+        if not game.summary_changed and not self.has_pending_confirmation(game.id):
+            logger.debug("No changes for game ID %s (%d of %d fetches skipped)",
+                         game.id, game.short_circuit_count, game.fetch_count)
+            return
+        logger.debug("Getting data for game ID %s", game.id)
+        game.summary_changed = False
+        scan_start = time.perf_counter()
+
+        drives = game.previous_drives
+        # Start over if ESPN removed or reordered drives before the cursor
+        if game.drive_cursor > len(drives) or (
+                game.drive_cursor and drives[game.drive_cursor - 1].id not in game.finalized_drive_ids):
+            game.reset_drive_cursor()
+
+        for index in range(game.drive_cursor, len(drives)):
+            drive = drives[index]
+            drive_id = drive.id
+            fingerprint = drive.fingerprint
+            changed = game.drive_fingerprints.get(drive_id) != fingerprint
+            game.drive_fingerprints[drive_id] = fingerprint
+
+            if changed or self.is_awaiting_confirmation(drive_id, game.id):
+                self.scan_drive(drive, game)
+
+            # Drives followed by another drive won't change again once handled
+            is_last = index == len(drives) - 1
+            if drive.result is not None and not is_last and \
+                    (not self.is_punt(drive) or self.has_been_tweeted(drive, game.id)):
+                game.finalized_drive_ids.add(drive_id)
+
+        while game.drive_cursor < len(drives) and \
+                drives[game.drive_cursor].id in game.finalized_drive_ids:
+            game.drive_cursor += 1
+
+        if game.is_final:
+            if self.has_been_final(game.id):
+                self.mark_game_completed(game.id)
+
+        SCAN_SECONDS.observe(time.perf_counter() - scan_start)
+
+    def scan_drive(self, drive, game):
+        if drive.result is None:
+            return
+
+        drive_plays = drive.plays
+        if len(drive_plays) < 2:
+            return
+
+        if not self.is_punt(drive):
+            return
+
+        if self.has_been_tweeted(drive, game.id) or self.is_being_posted(drive, game.id):
+            return
+
+        first_seen = not self.has_been_seen(drive, game.id)
+
+        punt = None
+        for index, play in enumerate(drive_plays):
+            if index == 0:
+                continue
+            if play.is_punt():
+                punt = play
+                prev_play = drive_plays[index - 1]
+
+        if not punt:
+            punt = drive_plays[-1]
+            prev_play = drive_plays[-2]
+
+        # A punt that isn't confirmed yet is checked again on the next pass
+        if not self.punt_confirmation.should_post(punt, drive, game, first_seen):
+            return
+
+        try:
+            self.tweet_play(punt, prev_play, drive, game, game.id)
+        except BaseException as e:
+            error_str = "Failed to tweet play from drive " + \
+                drive.id
+            logger.exception(error_str)
+            self.send_error_message(e, error_str)
+
+    def live_callback(self, games=None):
+        if games is None:
+            games = self.get_active_game_ids()
+        for game in games:
+            self.scan_game(game)
+            self.poll_scheduler.schedule(game, self.has_pending_confirmation(game.id))
+
+    @staticmethod
+    def parse_arguments():
         parser = argparse.ArgumentParser(description="Run the Surrender Index bot.")
         parser.add_argument('--disableTweeting', action='store_true', dest='disableTweeting')
         parser.add_argument('--disableNotifications', action='store_true', dest='disableNotifications')
@@ -515,8 +950,39 @@ class SurrenderIndexBot:
         parser.add_argument('--enableMainAccount', action='store_true', dest='enableMainAccount')
         parser.add_argument('--disableTweepyReply', action='store_true', dest='disableTweepyReply')
         parser.add_argument('--enableCancel', action='store_true', dest='enableCancel')
-
-        args = parser.parse_args()
+        parser.add_argument('--leagues', nargs='+', choices=sorted(LEAGUES), default=['nfl'], dest='leagues')
+        parser.add_argument('--fetchWorkers', type=int, dest='fetchWorkers',
+                            help="Concurrent summary requests (default 8 per league)")
+        parser.add_argument('--fetchDeadline', type=float, default=20, dest='fetchDeadline')
+        parser.add_argument('--minPollInterval', type=float, default=5, dest='minPollInterval')
+        parser.add_argument('--maxPollInterval', type=float, default=120, dest='maxPollInterval')
+        parser.add_argument('--espnBaseUrl', default=ESPN_API_ROOT, dest='espnBaseUrl')
+        parser.add_argument('--record', dest='record')
+        parser.add_argument('--fakeMastodon', nargs='?', const='fake_mastodon.jsonl', dest='fakeMastodon')
+        parser.add_argument('--confirmation', choices=CONFIRMATION_STRATEGIES, default='stable',
+                            dest='confirmation')
+        parser.add_argument('--metricsPort', type=int, dest='metricsPort')
+        parser.add_argument('--metricsFile', dest='metricsFile')
+        parser.add_argument('--metricsInterval', type=float, default=15, dest='metricsInterval')
+        parser.add_argument('--percentiles', choices=['exact', 'sketch'], default='exact', dest='percentiles')
+        parser.add_argument('--sketchCompression', type=float, default=200, dest='sketchCompression')
+        parser.add_argument('--situationalContext', action='store_true', dest='situationalContext')
+        parser.add_argument('--role', choices=SHARDING_ROLES, default='standalone', dest='role')
+        parser.add_argument('--workerId', dest='workerId')
+        parser.add_argument('--leaseSeconds', type=float, default=60, dest='leaseSeconds')
+        parser.add_argument('--postWorkers', type=int, default=4, dest='postWorkers')
+        parser.add_argument('--scheduleRefreshSeconds', type=float, default=60 * 60, dest='scheduleRefreshSeconds')
+        parser.add_argument('--stateDb', default='surrender_index_state.db', dest='stateDb')
+        parser.add_argument('--puntStoreDir', default='', dest='puntStoreDir')
+        return parser.parse_args()
+
+    def run(self, args=None):
+        """
+        Parameters:
+            args: Parsed command-line arguments; they're read from sys.argv if omitted.
+        """
+        if args is None:
+            args = self.parse_arguments()
 
         self.should_tweet = not args.disableTweeting
         self.should_text = not args.disableNotifications
@@ -525,30 +991,78 @@ class SurrenderIndexBot:
         self.enable_cancel = not args.enableCancel
         self.notify_using_twilio = args.notifyUsingTwilio
         self.debug = args.debug
+        logging.basicConfig(level=logging.DEBUG if self.debug else logging.INFO,
+                            format='%(asctime)s %(levelname)s %(name)s: %(message)s')
         self.not_headless = args.notHeadless
-
-        print("Tweeting Enabled" if self.should_tweet else "Tweeting Disabled")
+        self.leagues = [LEAGUES[key] for key in args.leagues]
+        self.percentile_mode = args.percentiles
+        self.sketch_compression = args.sketchCompression
+        self.situational_context = args.situationalContext
+        self.startup_timer.mark('arguments')
+        # All leagues share one connection pool, so it grows with them
+        self.fetch_workers = args.fetchWorkers or 8 * len(self.leagues)
+        self.fetch_deadline = args.fetchDeadline
+        self.schedule.refresh_interval = args.scheduleRefreshSeconds
+        self.poll_scheduler = PollScheduler(args.minPollInterval, args.maxPollInterval)
+        self.punt_confirmation = PuntConfirmation(args.confirmation)
+        self.espn_api_root = args.espnBaseUrl.rstrip('/')
+        if args.role == 'worker':
+            self.enable_worker(args.workerId, args.leaseSeconds)
+        elif args.role == 'coordinator':
+            self.role = 'coordinator'
+            # Workers schedule boosts and replies, and the coordinator runs them
+            self.job_queue.refresh_interval = 10
+        # Loaded once, before the first punt needs them
+        if self.role != 'coordinator':
+            self.load_percentile_engines()
+            if self.situational_context:
+                for league in self.leagues:
+                    self.get_situational_index(league.key)
+        self.startup_timer.mark('percentiles')
+        if args.record:
+            from replay import Recorder
+            self.recorder = Recorder(args.record)
+        # Accounts only log in when they first post
+        self.create_mastodon_accounts(args.fakeMastodon)
+        if args.metricsPort:
+            start_metrics_server(args.metricsPort)
+        if args.metricsFile:
+            self.metrics_writer = MetricsFileWriter(args.metricsFile, args.metricsInterval).start()
+
+        logger.info("Tweeting Enabled" if self.should_tweet else "Tweeting Disabled")
         if self.should_tweet:
-            print("Main account enabled" if self.enable_main_account else "Main account disabled")
-            print("Replying using tweepy" if self.reply_using_tweepy else "Replying using webdriver")
+            logger.info("Main account enabled" if self.enable_main_account else "Main account disabled")
+            logger.info("Replying using tweepy" if self.reply_using_tweepy else "Replying using webdriver")
 
-        self.historical_surrender_indices = self.load_historical_surrender_indices()
         self.sleep_time = 1
-        self.completed_game_ids = set()
-        self.final_games = set()
+
+        # Workers leave their jobs to the coordinator
+        if self.role != 'worker':
+            self.job_queue.start()
+        self.posting_pipeline.max_workers = args.postWorkers
+        self.posting_pipeline.start()
 
         should_continue = True
         while should_continue:
             try:
-                self.session = requests.Session()
-                retries = Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-                self.session.mount('http://', HTTPAdapter(max_retries=retries))
+                if self.game_fetcher:
+                    self.game_fetcher.close()
+                self.game_fetcher = GameFetcher(self.fetch_workers, self.fetch_deadline)
+                self.session = self.game_fetcher.create_session()
+                if self.recorder:
+                    self.recorder.attach(self.session)
 
                 #self.send_heartbeat_message(should_repeat=False)
                 #TODO: Add method to handle displaying status of bot
-                self.update_current_week_games()
-                self.load_tweeted_plays_dict()
-                self.seen_plays = {}
+                if self.role == 'worker':
+                    self.load_published_games()
+                else:
+                    self.update_current_week_games()
+                if self.role == 'coordinator':
+                    self.publish_current_week_games()
+                self.startup_timer.mark('games')
+                self.load_state()
+                self.startup_timer.mark('load_state')
 
                 now = self.get_now()
                 if now.hour < 5:
@@ -557,6 +1071,8 @@ class SurrenderIndexBot:
                     now += timedelta(days=1)
                     stop_date = now.replace(hour=5, minute=0, second=0, microsecond=0)
 
+                if self.role == 'coordinator':
+                    self.run_coordinator(stop_date)
                 while self.get_now() < stop_date:
                     start_time = time.time()
                     self.download_data_for_active_games()
@@ -564,13 +1080,23 @@ class SurrenderIndexBot:
             except KeyboardInterrupt:
                 should_continue = False
             except Exception as e:
-                traceback.print_exc()
-                print("Error occurred:", e)
-                print("Sleeping for", self.sleep_time, "minutes")
+                logger.exception("Error occurred: %s", e)
+                logger.error("Sleeping for %s minutes", self.sleep_time)
                 self.send_error_message(e)
                 time.sleep(self.sleep_time * 60)
                 self.sleep_time *= 2
 
+        # Posts schedule boosts and replies, so they're sent first
+        self.posting_pipeline.stop()
+        self.job_queue.stop()
+        if self.lease_manager is not None:
+            self.lease_manager.release()
+        if self.recorder:
+            self.recorder.close()
+        if self.metrics_writer:
+            self.metrics_writer.stop()
+
 if __name__ == "__main__":
-    bot = SurrenderIndexBot()
-    bot.run()
+    args = SurrenderIndexBot.parse_arguments()
+    bot = SurrenderIndexBot(args.stateDb, args.puntStoreDir)
+    bot.run(args)